@@ -3,28 +3,256 @@ ARCS - Camera Module
 Handles camera initialization and MJPEG streaming.
 """
 
+import os
 import time
 import cv2
 import numpy as np
 import threading
+from functools import lru_cache, partial
 
 from core.config_manager import get_config
 from state import state
 
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    TURBOJPEG_AVAILABLE = True
+except ImportError:
+    TURBOJPEG_AVAILABLE = False
+
 CAMERA_PORT = get_config("CAMERA_PORT")
 CAMERA_WIDTH = get_config("CAMERA_WIDTH")
 CAMERA_HEIGHT = get_config("CAMERA_HEIGHT")
 CAMERA_BUFFER_SIZE = get_config("CAMERA_BUFFER_SIZE")
+CAMERA_FPS = get_config("CAMERA_FPS", 30)
+CAMERA_DEBUG_LATENCY = get_config("CAMERA_DEBUG_LATENCY", False)
 STREAM_WIDTH = get_config("STREAM_WIDTH")
 STREAM_HEIGHT = get_config("STREAM_HEIGHT")
 STREAM_JPEG_QUALITY = get_config("STREAM_JPEG_QUALITY")
+STREAM_MAX_FPS = get_config("STREAM_MAX_FPS", 30)
 CAMERA_RIGHT_PORT = get_config("CAMERA_RIGHT_PORT")
+STREAM_ENCODER = get_config("STREAM_ENCODER", "cpu")
+USE_V4L2_PASSTHROUGH = get_config("USE_V4L2_PASSTHROUGH", False)
+CAMERA_GST_PIPELINE = get_config("CAMERA_GST_PIPELINE", "")
+
+_STREAM_FRAME_PERIOD = 1.0 / STREAM_MAX_FPS
+_STREAM_SIZE = (STREAM_WIDTH, STREAM_HEIGHT)
+
+def _pick_resize_interp(src_width, src_height):
+    """Interpolation for scaling a capture frame down to the stream size."""
+    if src_width >= 2 * STREAM_WIDTH and src_height >= 2 * STREAM_HEIGHT:
+        # Box filter for real downscales: cheaper per output pixel, less aliasing
+        # (OpenCV also has a dedicated fast path for integer factors)
+        return cv2.INTER_AREA
+    return cv2.INTER_LINEAR
+
+
+_RESIZE_INTERP = _pick_resize_interp(CAMERA_WIDTH, CAMERA_HEIGHT)
+
+
+def _make_pillow_simd_resizer():
+    """cv2.resize-compatible wrapper over Pillow-SIMD, or None if not installed."""
+    try:
+        import PIL
+        from PIL import Image
+    except ImportError:
+        return None
+    # Pillow-SIMD releases are tagged .postN; stock Pillow has no SIMD resize
+    if ".post" not in PIL.__version__:
+        return None
+
+    # Pillow filter doing the same job as each cv2 interpolation flag
+    filters = {
+        cv2.INTER_NEAREST: Image.NEAREST,
+        cv2.INTER_LINEAR: Image.BILINEAR,
+        cv2.INTER_AREA: Image.BOX,
+        cv2.INTER_CUBIC: Image.BICUBIC,
+        cv2.INTER_LANCZOS4: Image.LANCZOS,
+    }
+
+    def _resize(frame, size, dst=None, interpolation=cv2.INTER_LINEAR):
+        height, width = frame.shape[:2]
+        img = Image.frombuffer("RGB", (width, height), frame, "raw", "BGR", 0, 1)
+        img = img.resize(size, filters.get(interpolation, Image.BILINEAR))
+        out = np.frombuffer(img.tobytes("raw", "BGR"), np.uint8).reshape(size[1], size[0], 3)
+        if dst is None:
+            return out
+        # Same contract as cv2.resize: fill and return the caller's buffer
+        np.copyto(dst, out)
+        return dst
+
+    return _resize
+
+
+@lru_cache(maxsize=None)
+def _select_resizer(runs=5):
+    """Pick the faster stream resizer for this machine with a quick benchmark.
+
+    Run on the first capture thread start rather than at import, then
+    cached. Both backends run the same filter (cv2 flag mapped to its
+    Pillow equivalent) into the same preallocated destination.
+    """
+    pillow_resize = _make_pillow_simd_resizer()
+    if pillow_resize is None:
+        return cv2.resize
+
+    sample = np.zeros((CAMERA_HEIGHT, CAMERA_WIDTH, 3), np.uint8)
+    dst = np.empty((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
+    timings = {}
+    for resize in (cv2.resize, pillow_resize):
+        start = time.perf_counter()
+        for _ in range(runs):
+            resize(sample, _STREAM_SIZE, dst=dst, interpolation=_RESIZE_INTERP)
+        timings[resize] = time.perf_counter() - start
+    best = min(timings, key=timings.get)
+    if best is pillow_resize:
+        print("[Camera] Using Pillow-SIMD for stream resize")
+    return best
+
+
+
+def _mcu_crop(width, height, mcu=16):
+    """Centre crop trimming a frame to whole 4:2:0 JPEG MCUs, or None if aligned."""
+    aligned_w = max(mcu, width - width % mcu)
+    aligned_h = max(mcu, height - height % mcu)
+    if (aligned_w, aligned_h) == (width, height):
+        return None
+    top = (height - aligned_h) // 2
+    left = (width - aligned_w) // 2
+    return (slice(top, top + aligned_h), slice(left, left + aligned_w))
+
+
+# e.g. 640x360 -> 640x352: the encoder never hits its partial-MCU tail path,
+# and a row-only crop is a contiguous view (no copy)
+_STREAM_CROP = _mcu_crop(STREAM_WIDTH, STREAM_HEIGHT)
+
+# Multipart framing. Each frame is wrapped once by the capture thread and the
+# same bytes object is yielded to every client (Werkzeug only writes bytes,
+# so memoryviews or split chunks would just add writes and flushes)
+_BOUNDARY_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+_TRAILER = b'\r\n'
 
 
+def _frame_part(jpeg_bytes):
+    return b''.join((_BOUNDARY_HEADER, jpeg_bytes, _TRAILER))
 
-def _connect_camera_device(port, width, height, fps=30):
+
+# Explicit 4:2:0: half the chroma bytes of 4:4:4 and libjpeg-turbo's fastest path
+_CV2_JPEG_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY,
+    cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+    cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+]
+
+
+def _encode_jpeg_cv2(frame):
+    _, buffer = cv2.imencode('.jpg', frame, _CV2_JPEG_PARAMS)
+    return buffer.tobytes()
+
+
+def _make_turbojpeg_encoder():
+    """Build a libjpeg-turbo encoder taking BGR directly, or None if unavailable."""
+    if not TURBOJPEG_AVAILABLE:
+        return None
+    try:
+        jpeg = TurboJPEG()
+    except OSError:
+        # Python bindings installed but libturbojpeg is missing
+        return None
+
+    def _encode(frame):
+        return jpeg.encode(frame, quality=STREAM_JPEG_QUALITY,
+                           pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+
+    return _encode
+
+
+# Best available CPU encoder: libjpeg-turbo directly, else OpenCV
+_encode_jpeg_cpu = _make_turbojpeg_encoder() or _encode_jpeg_cv2
+
+
+def _make_nvjpeg_encoder():
+    """Build a GPU JPEG encoder (nvJPEG via torchvision), or None if unavailable."""
+    try:
+        import torch
+        from torchvision.io import encode_jpeg
+    except ImportError:
+        return None
+    if not torch.cuda.is_available():
+        return None
+
+    stream = torch.cuda.Stream()
+
+    def _encode(frame):
+        with torch.cuda.stream(stream):
+            # HWC BGR uint8 -> CHW RGB on the GPU
+            tensor = torch.from_numpy(frame).cuda(non_blocking=True)
+            tensor = tensor.permute(2, 0, 1).flip(0).contiguous()
+            return encode_jpeg(tensor, quality=STREAM_JPEG_QUALITY).cpu().numpy().tobytes()
+
+    return _encode
+
+
+def _make_stream_encoder():
+    """Build a stream encoder owned by one capture thread.
+
+    Each camera gets its own libjpeg-turbo handle / CUDA stream so the two
+    capture threads encode concurrently without sharing encoder state.
+    Chosen once per thread so the capture loop never branches on the backend.
+    """
+    if STREAM_ENCODER == "nvjpeg":
+        encoder = _make_nvjpeg_encoder()
+        if encoder is not None:
+            print("[Camera] Using nvJPEG hardware encoder")
+            return encoder
+        print("[Camera] nvJPEG unavailable, falling back to CPU encoder")
+    return _make_turbojpeg_encoder() or _encode_jpeg_cv2
+
+
+def _encode_blank(text, color=(255, 255, 255)):
+    """Render a placeholder frame with a text label and encode it as JPEG."""
+    frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
+    cv2.putText(frame, text, (20, STREAM_HEIGHT//2),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    if _STREAM_CROP:
+        frame = frame[_STREAM_CROP]
+    return _encode_jpeg_cpu(frame)
+
+
+# Placeholder frames, encoded and framed once instead of per thread/connection
+_STARTING_PART = _frame_part(_encode_blank("STARTING..."))
+_WAITING_PART = _frame_part(_encode_blank("WAITING..."))
+
+
+def _fourcc_name(camera):
+    """Negotiated pixel format, e.g. 'MJPG' or 'YUYV' (YUYV means no passthrough)."""
+    code = int(camera.get(cv2.CAP_PROP_FOURCC))
+    return "".join(chr((code >> shift) & 0xFF) for shift in (0, 8, 16, 24)).strip("\0 ") or "?"
+
+
+def _gst_outputs_jpeg(pipeline):
+    """Whether a GStreamer pipeline hands JPEG (not raw pixels) to appsink."""
+    return "jpegenc" in pipeline or "image/jpeg" in pipeline
+
+
+def _open_gst_camera(port, width, height, fps):
+    # v4l2src needs a device path; OpenCV-style indices map to /dev/videoN
+    if isinstance(port, int) or (isinstance(port, str) and port.isdigit()):
+        port = f"/dev/video{int(port)}"
+    pipeline = CAMERA_GST_PIPELINE.format(device=port, width=width, height=height, fps=fps)
+    camera = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+    if camera.isOpened():
+        print("✓ (GStreamer)")
+        return camera
+    print("✗ (GStreamer)")
+    return None
+
+
+def _connect_camera_device(port, width, height, fps=CAMERA_FPS):
     print(f"📷 Connecting camera ({port})...", end=" ", flush=True)
     try:
+        if CAMERA_GST_PIPELINE:
+            return _open_gst_camera(port, width, height, fps)
+
         try:
             camera = cv2.VideoCapture(port, cv2.CAP_V4L2)
         except Exception:
@@ -34,13 +262,17 @@ def _connect_camera_device(port, width, height, fps=30):
         camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)
         camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         camera.set(cv2.CAP_PROP_FPS, fps)
-        camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        camera.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_BUFFER_SIZE)
+        mjpg = cv2.VideoWriter_fourcc('M', 'J', 'P', 'G')
+        if USE_V4L2_PASSTHROUGH and int(camera.get(cv2.CAP_PROP_FOURCC)) == mjpg:
+            # Hand back the camera's compressed MJPEG buffer instead of BGR
+            camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)
         
         if camera.isOpened():
             # Drain stale frames
             for _ in range(5):
                 camera.grab()
-            print("✓")
+            print(f"✓ ({_fourcc_name(camera)})")
             return camera
         else:
             print("✗")
@@ -51,6 +283,71 @@ def _connect_camera_device(port, width, height, fps=30):
         return None
 
 
+_LATENCY_LOG_INTERVAL_NS = 3_000_000_000
+
+# Capture buffers rotated per camera: a published frame stays intact for
+# this many capture periods minus one before retrieve() reuses it
+_FRAME_RING_SIZE = 3
+
+
+class _LatencyStats:
+    """Resize+encode timing for one capture loop, printed every few seconds."""
+
+    __slots__ = ('label', 'window_start_ns', 'frames', 'total_ns', 'max_ns')
+
+    def __init__(self, label):
+        self.label = label
+        self.window_start_ns = time.monotonic_ns()
+        self.frames = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, start_ns, end_ns):
+        span_ns = end_ns - start_ns
+        self.frames += 1
+        self.total_ns += span_ns
+        if span_ns > self.max_ns:
+            self.max_ns = span_ns
+
+        window_ns = end_ns - self.window_start_ns
+        if window_ns < _LATENCY_LOG_INTERVAL_NS:
+            return
+        # Only format floats when actually logging
+        print(f"[Camera] {self.label}: {self.frames * 1e9 / window_ns:.1f} fps, "
+              f"encode avg {self.total_ns / self.frames * 1e-6:.2f} ms, "
+              f"max {self.max_ns * 1e-6:.2f} ms")
+        self.window_start_ns = end_ns
+        self.frames = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+
+def _is_passthrough(camera):
+    """True if retrieve() yields JPEG bytes rather than a BGR image."""
+    if CAMERA_GST_PIPELINE:
+        # e.g. a v4l2jpegenc/nvjpegenc pipeline: encoded by the SoC
+        return _gst_outputs_jpeg(CAMERA_GST_PIPELINE)
+    return bool(USE_V4L2_PASSTHROUGH) and camera.get(cv2.CAP_PROP_CONVERT_RGB) == 0
+
+
+def _pin_capture_thread(thread, core_offset=1):
+    """Pin a capture thread to a dedicated core and raise its priority (Linux only)."""
+    cpu_count = os.cpu_count() or 1
+    if cpu_count < 2:
+        return
+    core = max(0, cpu_count - core_offset)
+    try:
+        os.sched_setaffinity(thread.native_id, {core})
+    except (AttributeError, OSError) as e:
+        print(f"[Camera] Could not pin capture thread: {e}")
+        return
+    try:
+        # On Linux the niceness of a TID applies to that thread only
+        os.setpriority(os.PRIO_PROCESS, thread.native_id, -5)
+    except (AttributeError, OSError):
+        pass  # Needs CAP_SYS_NICE; affinity alone still helps
+
+
 def init_camera() -> bool:
     try:
         if state.camera and state.camera.isOpened():
@@ -58,7 +355,7 @@ def init_camera() -> bool:
         else:
             state.camera = _connect_camera_device(CAMERA_PORT, CAMERA_WIDTH, CAMERA_HEIGHT)
             if state.camera:
-                threading.Thread(target=_capture_loop, daemon=True).start()
+                _start_capture(_main_slot, core_offset=1)
 
         if state.camera_right and state.camera_right.isOpened():
              print(f"📷 Camera Right ({CAMERA_RIGHT_PORT})... ✓ (Already open)")
@@ -66,7 +363,7 @@ def init_camera() -> bool:
             if CAMERA_RIGHT_PORT:
                 state.camera_right = _connect_camera_device(CAMERA_RIGHT_PORT, CAMERA_WIDTH, CAMERA_HEIGHT)
                 if state.camera_right:
-                    threading.Thread(target=_capture_loop_right, daemon=True).start()
+                    _start_capture(_right_slot, core_offset=2)
 
         return True
 
@@ -79,219 +376,240 @@ def init_camera() -> bool:
 
 
 
-# Frame synchronization
-frame_condition = threading.Condition()
-encoded_frame = None
-current_frame_id = 0
+class _CamSlot:
+    """One camera's state names in `state`, latest stream frame and stream clients."""
 
-frame_condition_right = threading.Condition()
-encoded_frame_right = None
-current_frame_id_right = 0
+    __slots__ = ('label', 'camera_attr', 'frame_attr', 'frame_id_attr',
+                 'no_signal_part', 'latest', 'subscribers', 'capturing', 'owner')
 
+    def __init__(self, label, camera_attr, frame_attr, frame_id_attr, no_signal_part):
+        self.label = label
+        self.camera_attr = camera_attr
+        self.frame_attr = frame_attr
+        self.frame_id_attr = frame_id_attr
+        self.no_signal_part = no_signal_part
+        # (frame_id, multipart frame), replaced by a single reference store so
+        # readers always see a matching pair without taking a lock
+        self.latest = (0, None)
+        # One Event per connected stream client, copy-on-write so the capture
+        # loop can iterate it lock-free; it skips resize+encode while empty
+        self.subscribers = ()
+        # Plain flag mirroring "capture thread running on an open handle", so
+        # stream clients don't call into VideoCapture.isOpened() per frame
+        self.capturing = False
+        # Capture thread currently serving this slot; an older thread that
+        # outlives a release/re-init sees it is no longer the owner and exits
+        self.owner = None
 
-def _capture_loop():
-    global encoded_frame, current_frame_id
-    print("[Camera] Capture thread started")
-    
-    # Pre-allocate blank frame for fallback
-    blank_frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
-    cv2.putText(blank_frame, "WAITING...", (20, STREAM_HEIGHT//2), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    _, blank_buffer = cv2.imencode('.jpg', blank_frame, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
-    blank_bytes = blank_buffer.tobytes()
-    
-    with frame_condition:
-        encoded_frame = blank_bytes
-        frame_condition.notify_all()
 
-    while state.running and state.camera and state.camera.isOpened():
-        try:
-            # Non-blocking capture: grab() + retrieve() instead of read()
-            grabbed = state.camera.grab()
-            if grabbed:
-                ret, frame = state.camera.retrieve()
-            else:
-                ret = False
-                frame = None
-            
-            if ret and frame is not None:
-                state.latest_frame = frame
-                state.frame_id += 1
-                
-                # Resize and encode for streaming
-                stream_frame = cv2.resize(frame, (STREAM_WIDTH, STREAM_HEIGHT), interpolation=cv2.INTER_LINEAR)
-                _, buffer = cv2.imencode('.jpg', stream_frame, [
-                    cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY,
-                    cv2.IMWRITE_JPEG_OPTIMIZE, 0
-                ])
-                
-                with frame_condition:
-                    encoded_frame = buffer.tobytes()
-                    current_frame_id = state.frame_id
-                    frame_condition.notify_all()
-            else:
-                time.sleep(0.01)
-        except Exception as e:
-            print(f"[Camera] Thread error: {e}")
-            time.sleep(0.1)
-    print("[Camera] Capture thread stopped")
+_main_slot = _CamSlot("Main", "camera", "latest_frame", "frame_id",
+                      _frame_part(_encode_blank("NO SIGNAL", color=(0, 0, 255))))
+_right_slot = _CamSlot("Right", "camera_right", "latest_frame_right", "frame_id_right",
+                       _frame_part(_encode_blank("NO SIGNAL (RIGHT)", color=(0, 0, 255))))
 
+_sub_lock = threading.Lock()
+
+
+def _subscribe(slot, ev):
+    with _sub_lock:
+        slot.subscribers = slot.subscribers + (ev,)
+
+
+def _unsubscribe(slot, ev):
+    with _sub_lock:
+        slot.subscribers = tuple(e for e in slot.subscribers if e is not ev)
+
+
+def _publish(slot, frame_id, part):
+    slot.latest = (frame_id, part)
+    for ev in slot.subscribers:
+        ev.set()
 
-def _capture_loop_right():
-    global encoded_frame_right, current_frame_id_right
-    print("[Camera] Right capture thread started")
-    
-    # Pre-allocate blank frame
-    blank_frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
-    cv2.putText(blank_frame, "WAITING...", (20, STREAM_HEIGHT//2), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    _, blank_buffer = cv2.imencode('.jpg', blank_frame, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
-    blank_bytes = blank_buffer.tobytes()
-    
-    with frame_condition_right:
-        encoded_frame_right = blank_bytes
-        frame_condition_right.notify_all()
 
-    while state.running and state.camera_right and state.camera_right.isOpened():
+def _start_capture(slot, core_offset):
+    capture_thread = threading.Thread(target=_capture_loop, args=(slot,), daemon=True)
+    slot.owner = capture_thread
+    slot.capturing = True
+    capture_thread.start()
+    _pin_capture_thread(capture_thread, core_offset=core_offset)
+
+
+def _capture_loop(slot):
+    print(f"[Camera] {slot.label} capture thread started")
+    me = threading.current_thread()
+    try:
+        _run_capture(slot, me)
+    finally:
+        # Always clear the flag, even on an unexpected error, so stream clients
+        # fall back to NO SIGNAL -- but never for a newer thread that owns the slot
+        if slot.owner is me:
+            slot.capturing = False
+        print(f"[Camera] {slot.label} capture thread stopped")
+
+
+def _run_capture(slot, owner):
+    
+    _publish(slot, slot.latest[0], _WAITING_PART)
+
+    # Hoist the handle, bound methods and slot fields out of the hot loop
+    camera_attr = slot.camera_attr
+    frame_attr = slot.frame_attr
+    frame_id_attr = slot.frame_id_attr
+    camera = getattr(state, camera_attr)
+    grab = camera.grab
+    retrieve = camera.retrieve
+    is_opened = camera.isOpened
+    tick = 0
+    stats = _LatencyStats(slot.label) if CAMERA_DEBUG_LATENCY else None
+    # retrieve() decodes in place into these once they exist
+    ring = [None] * _FRAME_RING_SIZE
+    ring_idx = 0
+    # Per-thread resize target, reused every frame (the encoder is synchronous)
+    stream_buf = np.empty((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
+    # Module globals used per frame, bound once as fast locals
+    resize = _select_resizer()
+    encode = _make_stream_encoder()
+    publish = _publish
+    frame_part = _frame_part
+    stream_size = _STREAM_SIZE
+    stream_crop = _STREAM_CROP
+    # Decided once from the size the driver actually negotiated, which can
+    # differ from CAMERA_WIDTH/HEIGHT; the loop never re-evaluates it
+    src_width = int(camera.get(cv2.CAP_PROP_FRAME_WIDTH)) or CAMERA_WIDTH
+    src_height = int(camera.get(cv2.CAP_PROP_FRAME_HEIGHT)) or CAMERA_HEIGHT
+    interp = _pick_resize_interp(src_width, src_height)
+    passthrough = _is_passthrough(camera)
+    if passthrough:
+        print(f"[Camera] {slot.label} stream: JPEG passthrough at capture resolution")
+
+    while state.running and slot.capturing and slot.owner is owner:
+        # The handle only closes at shutdown, so re-check it every 32 frames
+        tick += 1
+        if not tick & 31 and (getattr(state, camera_attr) is not camera or not is_opened()):
+            break
         try:
-            # Non-blocking capture
-            grabbed = state.camera_right.grab()
-            if grabbed:
-                ret, frame = state.camera_right.retrieve()
+            # Non-blocking capture: grab() + retrieve() instead of read()
+            if grab():
+                ret, frame = retrieve(ring[ring_idx])
+                if ret:
+                    ring[ring_idx] = frame
+                    ring_idx = (ring_idx + 1) % _FRAME_RING_SIZE
             else:
                 ret = False
                 frame = None
             
+            if ret and frame is not None and passthrough:
+                # Camera already produced a JPEG: decode only for AI consumers
+                raw = frame
+                frame = cv2.imdecode(raw, cv2.IMREAD_COLOR)
+                ret = frame is not None
+
             if ret and frame is not None:
-                state.latest_frame_right = frame
-                state.frame_id_right += 1
+                frame_id = getattr(state, frame_id_attr) + 1
+                setattr(state, frame_attr, frame)
+                setattr(state, frame_id_attr, frame_id)
+
+                if not slot.subscribers:
+                    continue
                 
-                # Resize and encode
-                stream_frame = cv2.resize(frame, (STREAM_WIDTH, STREAM_HEIGHT), interpolation=cv2.INTER_LINEAR)
-                _, buffer = cv2.imencode('.jpg', stream_frame, [
-                    cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY,
-                    cv2.IMWRITE_JPEG_OPTIMIZE, 0
-                ])
+                if stats:
+                    encode_start_ns = time.monotonic_ns()
+                if passthrough:
+                    jpeg_bytes = raw.tobytes()
+                else:
+                    # Resize and encode for streaming
+                    height, width = frame.shape[:2]
+                    if (width, height) == stream_size:
+                        stream_frame = frame
+                    else:
+                        stream_frame = resize(frame, stream_size, dst=stream_buf,
+                                              interpolation=interp)
+                    if stream_crop:
+                        stream_frame = stream_frame[stream_crop]
+                    jpeg_bytes = encode(stream_frame)
                 
-                with frame_condition_right:
-                    encoded_frame_right = buffer.tobytes()
-                    current_frame_id_right = state.frame_id_right
-                    frame_condition_right.notify_all()
+                publish(slot, frame_id, frame_part(jpeg_bytes))
+                if stats:
+                    stats.record(encode_start_ns, time.monotonic_ns())
             else:
                 time.sleep(0.01)
-        except Exception as e:
-            print(f"[Camera] Right thread error: {e}")
+        except (cv2.error, OSError, RuntimeError) as e:
+            # RuntimeError covers the CUDA encoder; anything else is a bug
+            print(f"[Camera] {slot.label} thread error: {e}")
             time.sleep(0.1)
-    print("[Camera] Right capture thread stopped")
 
 
-def generate_frames():
-    global encoded_frame, current_frame_id
-    
-    current_frame = encoded_frame
-    last_sent_frame_id = 0
-    
-    # Create fallback frames
-    blank_frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
-    cv2.putText(blank_frame, "STARTING...", (20, STREAM_HEIGHT//2), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    _, buffer_starting = cv2.imencode('.jpg', blank_frame, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
-    starting_bytes = buffer_starting.tobytes()
-
-    error_frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
-    cv2.putText(error_frame, "NO SIGNAL", (20, STREAM_HEIGHT//2), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-    _, buffer_error = cv2.imencode('.jpg', error_frame, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
-    error_bytes = buffer_error.tobytes()
-
-    # Initial frame
-    current_frame = encoded_frame if encoded_frame else starting_bytes
-
-    yield (b'--frame\r\n'
-           b'Content-Type: image/jpeg\r\n\r\n' + current_frame + b'\r\n')
-    
-    while state.running:
-        # Check if camera exists
-        if state.camera is None or not state.camera.isOpened():
-             time.sleep(1)
-             yield (b'--frame\r\n'
-                    b'Content-Type: image/jpeg\r\n\r\n' + error_bytes + b'\r\n')
-             continue
-
-        with frame_condition:
-            notified = frame_condition.wait(timeout=0.1)
-            
-            if not notified:
-                # Timeout implies no new frames coming -> might be stuck
-                pass
+# How often an absent camera's NO SIGNAL frame is re-sent to keep clients alive
+_OFFLINE_REFRESH_S = 5.0
 
-            if current_frame_id == last_sent_frame_id:
-                # No new frame yet
-                continue
-            
-            current_frame = encoded_frame
-            last_sent_frame_id = current_frame_id
 
-        if current_frame:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + current_frame + b'\r\n')
+def _streaming_branch(slot, ready):
+    """Yield published frames until the slot's capture thread stops."""
+    last_sent_frame_id = 0
+    deadline = time.monotonic()
+    while state.running and slot.capturing:
+        # Plain reference read; the Event is only touched when idle
+        frame_id, current_part = slot.latest
+        if frame_id == last_sent_frame_id:
+            # No new frame yet: clear, re-check, then sleep until published
+            ready.clear()
+            if slot.latest[0] == last_sent_frame_id:
+                ready.wait(timeout=0.1)
+            continue
+        last_sent_frame_id = frame_id
+
+        if current_part:
+            yield current_part
+
+        # Pace on an absolute deadline so slow frames don't accumulate drift
+        deadline += _STREAM_FRAME_PERIOD
+        now = time.monotonic()
+        if now < deadline:
+            time.sleep(deadline - now)
+        else:
+            deadline = now
 
 
-def generate_frames_right():
-    global encoded_frame_right, current_frame_id_right
-    
-    current_frame = encoded_frame_right
-    last_sent_frame_id = 0
-    
-    # Create fallback frames
-    blank_frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
-    cv2.putText(blank_frame, "STARTING...", (20, STREAM_HEIGHT//2), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    _, buffer_starting = cv2.imencode('.jpg', blank_frame, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
-    starting_bytes = buffer_starting.tobytes()
-
-    error_frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
-    cv2.putText(error_frame, "NO SIGNAL (RIGHT)", (20, STREAM_HEIGHT//2), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-    _, buffer_error = cv2.imencode('.jpg', error_frame, [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY])
-    error_bytes = buffer_error.tobytes()
-
-    # Initial frame
-    current_frame = encoded_frame_right if encoded_frame_right else starting_bytes
-
-    yield (b'--frame\r\n'
-           b'Content-Type: image/jpeg\r\n\r\n' + current_frame + b'\r\n')
-    
+def _offline_branch(slot, ready):
+    """Re-send the cached NO SIGNAL frame until a capture thread starts."""
+    error_part = slot.no_signal_part
     while state.running:
-        # Check if right camera exists
-        if state.camera_right is None or not state.camera_right.isOpened():
-             time.sleep(1)
-             yield (b'--frame\r\n'
-                    b'Content-Type: image/jpeg\r\n\r\n' + error_bytes + b'\r\n')
-             continue
-
-        with frame_condition_right:
-            notified = frame_condition_right.wait(timeout=0.1)
-            
-            if not notified:
-                pass
-            
-            if current_frame_id_right == last_sent_frame_id:
-                continue
-            
-            current_frame = encoded_frame_right
-            last_sent_frame_id = current_frame_id_right
+        ready.clear()
+        if slot.capturing:
+            return
+        yield error_part
+        # A (re)started capture thread publishes, which sets `ready`
+        ready.wait(timeout=_OFFLINE_REFRESH_S)
 
-        if current_frame:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + current_frame + b'\r\n')
 
+def _generate_frames(slot):
+    ready = threading.Event()
+    _subscribe(slot, ready)
+    try:
+        # Initial frame
+        yield slot.latest[1] or _STARTING_PART
+
+        # Each branch returns when the capture state flips, so the check
+        # happens once per transition instead of on every frame
+        while state.running:
+            if slot.capturing:
+                yield from _streaming_branch(slot, ready)
+            else:
+                yield from _offline_branch(slot, ready)
+    finally:
+        _unsubscribe(slot, ready)
 
 
+generate_frames = partial(_generate_frames, _main_slot)
+generate_frames_right = partial(_generate_frames, _right_slot)
 
 
 def release_camera():
     """Release camera resources."""
+    # Stop the capture loops before their handles go away
+    _main_slot.capturing = False
+    _right_slot.capturing = False
+
     if state.camera:
         try:
             state.camera.release()
@@ -3,14 +3,35 @@ Configuration Manager
 Reads/writes config.json with fallback to config.py defaults.
 """
 import os
+import sys
 import json
 import logging
 from pathlib import Path
 from typing import Any, Dict
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# config.json is one flat object; both paths go bytes <-> dict directly,
+# picked once here rather than branched on per load/save
+if ORJSON_AVAILABLE:
+    _json_loads = orjson.loads
+
+    def _json_dumps(data: Dict[str, Any]) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(data: Dict[str, Any]) -> bytes:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
 logger = logging.getLogger(__name__)
 
 CONFIG_JSON_PATH = Path("config.json")
+CONFIG_TMP_PATH = CONFIG_JSON_PATH.with_name(CONFIG_JSON_PATH.name + ".tmp")
 
 # Default values (matching config.py)
 DEFAULTS = {
@@ -33,6 +54,8 @@ DEFAULTS = {
     "CAMERA_WIDTH": 1280,
     "CAMERA_HEIGHT": 720,
     "CAMERA_BUFFER_SIZE": 1,
+    "CAMERA_FPS": 30,
+    "CAMERA_DEBUG_LATENCY": False,  # Log stream encode timing every 3s
     
     # Obstacle Detection
     "OBSTACLE_SOBEL_THRESHOLD": 45,
@@ -42,6 +65,10 @@ DEFAULTS = {
     "STREAM_WIDTH": 640,
     "STREAM_HEIGHT": 360,
     "STREAM_JPEG_QUALITY": 50,
+    "STREAM_MAX_FPS": 30,          # Per-client delivery cap
+    "STREAM_ENCODER": "cpu",       # "cpu" or "nvjpeg" (CUDA, needs torchvision)
+    "USE_V4L2_PASSTHROUGH": False, # Stream the camera's own MJPEG (capture resolution)
+    "CAMERA_GST_PIPELINE": "",     # Optional GStreamer capture pipeline, {device} = port
     
     # Control intervals
     "MOVEMENT_LOOP_INTERVAL": 0.05,
@@ -57,9 +84,14 @@ DEFAULTS = {
     # Safety
     "REMOTE_TIMEOUT": 0.5,
     "AI_MIN_BRIGHTNESS": 40,
+    "AI_IMAGE_FORMAT": "jpeg",  # "webp" is ~30% smaller if the model accepts it
     "STALL_LOAD_THRESHOLD": 600,
     "STALL_CHECK_INTERVAL": 0.5,
     
+    # Policy Execution
+    "POLICY_COMPILE": False,       # torch.compile the policy model (slower load, faster ticks)
+    "POLICY_PRECISION": "fp32",    # "fp32", or opt-in "fp16"/"bf16" (GPU) or "int8" (CPU)
+    
     # Text-to-Speech
     "TTS_ENABLED": True,
     "TTS_AUDIO_DEVICE": "plughw:1,0",
@@ -77,27 +109,36 @@ DEFAULTS = {
     "LIDAR_I2C_ADDRESS": 16,       # Default TF-Luna I2C address (0x10 = 16)
 }
 
+# Direct alias of the loaded config dict for get_config(); rebound by _load()
+_CACHE: Dict[str, Any] = {}
+
 
 class ConfigManager:
     def __init__(self):
         self._cache: Dict[str, Any] = {}
+        # set() changes not yet written to disk
+        self._dirty = False
         self._load()
     
     def _load(self):
         """Load config from JSON, merging with defaults."""
-        self._cache = DEFAULTS.copy()
+        global _CACHE
+        self._cache = _CACHE = DEFAULTS.copy()
+        # Bound once; update()/set() mutate the dict in place so it stays valid
+        self._get = self._cache.get
         
-        if CONFIG_JSON_PATH.exists():
-            try:
-                with open(CONFIG_JSON_PATH, 'r') as f:
-                    user_config = json.load(f)
-                self._cache.update(user_config)
-            except Exception as e:
-                logger.warning(f"Failed to load config.json: {e}")
-        else:
+        try:
+            user_config = _json_loads(CONFIG_JSON_PATH.read_bytes())
+            # Keys already in DEFAULTS keep the interned literal from this
+            # module; intern the rest so lookups with literal keys from
+            # callers hit dict's identity fast path
+            self._cache.update((sys.intern(k), v) for k, v in user_config.items())
+        except FileNotFoundError:
             # Auto-create with defaults
             self._save()
             logger.info("Created default config.json")
+        except Exception as e:
+            logger.warning(f"Failed to load config.json: {e}")
             
         # Inject API Key into Environment for LangChain/OpenAI
         api_key = self._cache.get("OPENAI_API_KEY", "")
@@ -108,8 +149,11 @@ class ConfigManager:
     def _save(self):
         """Write current config to JSON."""
         try:
-            with open(CONFIG_JSON_PATH, 'w') as f:
-                json.dump(self._cache, f, indent=4)
+            # Write a temp file and rename it over config.json, so a crash
+            # mid-write never leaves a truncated config behind
+            CONFIG_TMP_PATH.write_bytes(_json_dumps(self._cache))
+            os.replace(CONFIG_TMP_PATH, CONFIG_JSON_PATH)
+            self._dirty = False
             return True
         except Exception as e:
             logger.error(f"Failed to save config.json: {e}")
@@ -117,7 +161,7 @@ class ConfigManager:
     
     def get(self, key: str, default: Any = None) -> Any:
         """Get a config value."""
-        return self._cache.get(key, default)
+        return self._get(key, default)
     
     def get_all(self) -> Dict[str, Any]:
         """Get all config values."""
@@ -126,10 +170,15 @@ class ConfigManager:
     def set(self, key: str, value: Any):
         """Set a single config value (does not auto-save)."""
         self._cache[key] = value
+        self._dirty = True
     
     def update(self, data: Dict[str, Any]) -> bool:
-        """Update multiple values and save."""
-        self._cache.update(data)
+        """Update multiple values and save (skipped when nothing changed)."""
+        cache = self._cache
+        changed = {k: v for k, v in data.items() if k not in cache or cache[k] != v}
+        if not changed and not self._dirty:
+            return True
+        cache.update(changed)
         return self._save()
     
     def get_defaults(self) -> Dict[str, Any]:
@@ -142,8 +191,11 @@ config_manager = ConfigManager()
 
 
 def get_config(key: str, default: Any = None) -> Any:
-    """Convenience function to get a config value."""
-    return config_manager.get(key, default)
+    """Convenience function to get a config value.
+
+    Pass keys as string literals; they are interned like the cache keys.
+    """
+    return _CACHE.get(key, default)
 
 
 def save_config() -> bool:
@@ -1,4 +1,8 @@
+from __future__ import annotations
+
+import copy
 import logging
+import queue
 import time
 import threading
 import subprocess
@@ -8,9 +12,7 @@ from typing import Optional, Dict
 import cv2
 import numpy as np
 import torch
-from huggingface_hub import HfApi
 
-from lerobot.datasets.lerobot_dataset import LeRobotDataset
 from state import state
 from core.training_manager import get_hf_username
 
@@ -18,6 +20,38 @@ logger = logging.getLogger(__name__)
 
 DATASET_ROOT = Path("logs/datasets")
 FPS = 30
+# Captured frames waiting for add_frame(); new frames are dropped when full
+FRAME_QUEUE_SIZE = 4
+# Image buffer sets per camera: every queued frame, the one being added and
+# the one being captured each hold their own
+_IMAGE_BUF_COUNT = FRAME_QUEUE_SIZE + 2
+# Upper bounds for stop/episode waits, so a wedged add_frame() can't hang them
+THREAD_JOIN_TIMEOUT = 2.0
+WRITER_DRAIN_TIMEOUT = 10.0
+
+JOINT_NAMES = ("shoulder_pan", "shoulder_lift", "elbow_flex", "wrist_flex", "wrist_roll", "gripper")
+
+# Imported by _load_lerobot_dataset() on first recording; lerobot drags in
+# a large dependency tree that most sessions never use
+LeRobotDataset = None
+
+
+def _load_lerobot_dataset():
+    global LeRobotDataset
+    if LeRobotDataset is None:
+        from lerobot.datasets.lerobot_dataset import LeRobotDataset as _LeRobotDataset
+        LeRobotDataset = _LeRobotDataset
+    return LeRobotDataset
+
+
+# LeRobot feature schema, built once; create() gets a deep copy since
+# LeRobot annotates the nested feature dicts (e.g. video info) in place
+_DATASET_FEATURES = {
+    "observation.images.main": {"dtype": "video", "shape": (3, 480, 640), "names": ["channel", "height", "width"]},
+    "observation.images.right": {"dtype": "video", "shape": (3, 480, 640), "names": ["channel", "height", "width"]},
+    "observation.state": {"dtype": "float32", "shape": (6,), "names": list(JOINT_NAMES)},
+    "action": {"dtype": "float32", "shape": (6,), "names": list(JOINT_NAMES)},
+}
 
 class DatasetRecorder:
     def __init__(self, main_camera, right_camera=None):
@@ -29,13 +63,57 @@ class DatasetRecorder:
         self.frame_idx = 0
         self.dataset: Optional[LeRobotDataset] = None
         self.thread: Optional[threading.Thread] = None
+        self.writer_thread: Optional[threading.Thread] = None
         self._lock = threading.Lock()
+        # Set while stop_recording() waits on the threads outside _lock
+        self._stopping = False
+        # Held around each capture; with _capture_paused set, no frame is
+        # being captured or queued (episode boundaries)
+        self._capture_lock = threading.Lock()
+        self._capture_paused = False
+        # Resolved once; matches the (3, 480, 640) image feature shape
+        self._resize_dims = (640, 480)
+        # Per-camera scratch buffers: resize target and the CHW tensor handed
+        # to add_frame(), plus its numpy view. Used round-robin; a set comes
+        # back around only after its frame has been added
+        self._main_bufs = [self._alloc_image_bufs() for _ in range(_IMAGE_BUF_COUNT)]
+        self._right_bufs = [self._alloc_image_bufs() for _ in range(_IMAGE_BUF_COUNT)]
+        self._buf_idx = 0
+        # Capture thread -> writer thread, so a slow add_frame() doesn't
+        # stall the 30 Hz capture
+        self._frame_queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        # Set on stop: the writer exits once its queue is empty, even if the
+        # None sentinel could not be queued
+        self._writer_stop = threading.Event()
+        self._dropped_frames = 0
+
+    def _alloc_image_bufs(self):
+        width, height = self._resize_dims
+        chw = torch.empty((3, height, width), dtype=torch.uint8)
+        return np.empty((height, width, 3), np.uint8), chw.numpy(), chw
+
+    def _image_to_chw(self, frame, bufs) -> torch.Tensor:
+        """Resize a BGR frame into the recorder's RGB CHW buffer."""
+        resize_dst, chw_np, chw = bufs
+        cv2.resize(frame, self._resize_dims, dst=resize_dst)
+        # BGR->RGB and HWC->CHW as one strided copy instead of two passes
+        np.copyto(chw_np, resize_dst[:, :, ::-1].transpose(2, 0, 1))
+        # Without an async image writer add_frame() has written the image by
+        # the time it returns, so the buffer can be shared; otherwise the
+        # queued write still references it
+        if getattr(self.dataset, "image_writer", None) is not None:
+            return chw.clone()
+        return chw
 
     def start_recording(self, dataset_name: str) -> bool:
         with self._lock:
             if self.is_recording:
                 logger.warning("Recording already in progress.")
                 return False
+            if self._stopping or any(t is not None and t.is_alive()
+                                     for t in (self.thread, self.writer_thread)):
+                logger.warning("Previous recording is still stopping.")
+                return False
 
             self.hf_username = get_hf_username()
             if not self.hf_username:
@@ -47,6 +125,7 @@ class DatasetRecorder:
             self.repo_id = f"{self.hf_username}/{dataset_name}"
 
             try:
+                LeRobotDataset = _load_lerobot_dataset()
                 if not self.dataset_dir.exists():
                     logger.info(f"Creating new dataset at {self.dataset_dir}")
                     self.dataset = LeRobotDataset.create(
@@ -54,12 +133,7 @@ class DatasetRecorder:
                         root=self.dataset_dir,
                         robot_type="so101_follower",
                         fps=FPS,
-                        features={
-                            "observation.images.main": {"dtype": "video", "shape": (3, 480, 640), "names": ["channel", "height", "width"]},
-                            "observation.images.right": {"dtype": "video", "shape": (3, 480, 640), "names": ["channel", "height", "width"]},
-                            "observation.state": {"dtype": "float32", "shape": (6,), "names": ["shoulder_pan", "shoulder_lift", "elbow_flex", "wrist_flex", "wrist_roll", "gripper"]},
-                            "action": {"dtype": "float32", "shape": (6,), "names": ["shoulder_pan", "shoulder_lift", "elbow_flex", "wrist_flex", "wrist_roll", "gripper"]},
-                        },
+                        features=copy.deepcopy(_DATASET_FEATURES),
                         use_videos=True
                     )
                 else:
@@ -79,7 +153,15 @@ class DatasetRecorder:
             self.is_recording = True
             # Reset frame_idx for the *current* episode being recorded
             self.frame_idx = 0
-
+            self._dropped_frames = 0
+            # Fresh queue per session, so nothing left from the last one
+            # (e.g. a stray sentinel) reaches the new writer
+            self._frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+            self._writer_stop = threading.Event()
+            self._capture_paused = False
+
+            self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self.writer_thread.start()
             self.thread = threading.Thread(target=self._recording_loop, daemon=True)
             self.thread.start()
             logger.info(f"Started recording dataset: {self.repo_id} (Episode {self.episode_idx})")
@@ -89,24 +171,67 @@ class DatasetRecorder:
         with self._lock:
             if not self.is_recording:
                 return False
-
             self.is_recording = False
-            if self.thread:
-                self.thread.join(timeout=1.0)
-
-            try:
-                self._save_episode()
-            except Exception as e:
-                logger.error(f"Failed to save episode: {e}")
+            self._stopping = True
+            capture_thread, writer_thread = self.thread, self.writer_thread
 
-            if self.dataset is None:
-                logger.error("Dataset object is None - cannot finalize or push")
-                return False
+        # Waits happen outside _lock so a wedged thread can't block other callers
+        try:
+            return self._finish_recording(capture_thread, writer_thread)
+        finally:
+            with self._lock:
+                self._stopping = False
+
+    def _finish_recording(self, capture_thread, writer_thread) -> bool:
+        # The capture thread must be gone before the sentinel goes in, or a
+        # late frame could land behind it
+        if capture_thread:
+            capture_thread.join(timeout=THREAD_JOIN_TIMEOUT)
+            if capture_thread.is_alive():
+                logger.error("Capture thread did not stop; late frames will be discarded")
+
+        # Let the writer add what is still queued, then stop it
+        drained = self._drain_queue()
+        self._writer_stop.set()
+        try:
+            # Wakes the writer now; if it is stuck the stop event ends it later
+            self._frame_queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if writer_thread:
+            writer_thread.join(timeout=THREAD_JOIN_TIMEOUT)
+        if self._dropped_frames:
+            logger.warning(f"Dropped {self._dropped_frames} frames while add_frame() was behind")
+        if not drained or (writer_thread and writer_thread.is_alive()):
+            # Saving while add_frame() is still running would corrupt the episode
+            logger.error("Writer thread is stuck in add_frame(); episode not saved")
+            return False
 
-            self._finalize_and_push()
+        try:
+            self._save_episode()
+        except Exception as e:
+            logger.error(f"Failed to save episode: {e}")
 
-            logger.info(f"Stopped recording. Dataset saved to {self.dataset_dir}")
-            return True
+        if self.dataset is None:
+            logger.error("Dataset object is None - cannot finalize or push")
+            return False
+
+        self._finalize_and_push()
+
+        logger.info(f"Stopped recording. Dataset saved to {self.dataset_dir}")
+        return True
+
+    def _drain_queue(self, timeout: float = WRITER_DRAIN_TIMEOUT) -> bool:
+        """Queue.join() with a timeout: True once every queued frame is added."""
+        frame_queue = self._frame_queue
+        deadline = time.monotonic() + timeout
+        with frame_queue.all_tasks_done:
+            while frame_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                frame_queue.all_tasks_done.wait(remaining)
+        return True
 
     def _cli_upload_fallback(self) -> None:
         logger.info("Trying fallback upload with huggingface-cli...")
@@ -142,16 +267,25 @@ class DatasetRecorder:
 
     def _recording_loop(self) -> None:
         """High-frequency loop to capture data."""
-        interval = 1.0 / FPS
-        next_tick = time.time() + interval
+        interval_ns = 1_000_000_000 // FPS
+        # Sleep until this close to the tick, then poll, so wakeup jitter
+        # doesn't push captures late
+        spin_ns = 1_000_000
+        next_tick = time.monotonic_ns() + interval_ns
 
         while self.is_recording:
-            now = time.time()
+            now = time.monotonic_ns()
             if now >= next_tick:
-                self._capture_frame(now)
-                next_tick += interval
+                with self._capture_lock:
+                    if not self._capture_paused:
+                        self._capture_frame(now / 1e9)
+                next_tick += interval_ns
+                if now - next_tick >= interval_ns:
+                    # Fell more than a frame behind: resync instead of bursting
+                    next_tick = now + interval_ns
             else:
-                time.sleep(0.001)
+                remaining = next_tick - now
+                time.sleep((remaining - spin_ns) / 1e9 if remaining > spin_ns else 0)
 
     def _capture_frame(self, timestamp: float) -> None:
         controller = state.controller
@@ -171,36 +305,32 @@ class DatasetRecorder:
                 logger.warning("Cannot capture: get_arm_position() returned None/empty")
             return
 
-        current_joints = [
-            arm_pos.get('shoulder_pan', 0),
-            arm_pos.get('shoulder_lift', 0),
-            arm_pos.get('elbow_flex', 0),
-            arm_pos.get('wrist_flex', 0),
-            arm_pos.get('wrist_roll', 0),
-            arm_pos.get('gripper', 0)
-        ]
+        current_joints = [arm_pos.get(name, 0) for name in JOINT_NAMES]
+
+        # Fresh storage per frame: LeRobot keeps these tensors in its episode
+        # buffer until save_episode(), so a reused buffer would be overwritten.
+        # The action mirrors the state, so both share one tensor that is
+        # never written after this point
+        state_vec = torch.from_numpy(np.array(current_joints, dtype=np.float32))
+        action_vec = state_vec
 
-        action_joints = current_joints
+        slot = self._buf_idx
 
         frame_main = None
         if state.latest_frame is not None:
-            frame_resized = cv2.resize(state.latest_frame, (640, 480))
-            frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-            frame_main = torch.from_numpy(frame_rgb).permute(2, 0, 1)
+            frame_main = self._image_to_chw(state.latest_frame, self._main_bufs[slot])
         elif self.frame_idx == 0:
             logger.warning("Cannot capture: state.latest_frame is None (camera not running?)")
             return
 
         frame_right = None
         if hasattr(state, 'latest_frame_right') and state.latest_frame_right is not None:
-            frame_right_resized = cv2.resize(state.latest_frame_right, (640, 480))
-            frame_rgb_right = cv2.cvtColor(frame_right_resized, cv2.COLOR_BGR2RGB)
-            frame_right = torch.from_numpy(frame_rgb_right).permute(2, 0, 1)
+            frame_right = self._image_to_chw(state.latest_frame_right, self._right_bufs[slot])
 
         frame_dict = {
             "observation.images.main": frame_main,
-            "observation.state": torch.tensor(current_joints, dtype=torch.float32),
-            "action": torch.tensor(action_joints, dtype=torch.float32),
+            "observation.state": state_vec,
+            "action": action_vec,
             "task": "pick up object",
         }
 
@@ -208,19 +338,53 @@ class DatasetRecorder:
             frame_dict["observation.images.right"] = frame_right
 
         try:
-            self.dataset.add_frame(frame_dict)
-            self.frame_idx += 1
-            if self.frame_idx % 100 == 0:
-                logger.info(f"Captured {self.frame_idx} frames")
-        except Exception as e:
-            if self.frame_idx == 0:
-                logger.error(f"add_frame failed: {e}")
+            self._frame_queue.put_nowait(frame_dict)
+        except queue.Full:
+            # Writer is behind: drop this frame, its buffers get reused
+            self._dropped_frames += 1
+            return
+        self._buf_idx = (slot + 1) % _IMAGE_BUF_COUNT
+
+    def _writer_loop(self) -> None:
+        """Hand captured frames to the dataset, in capture order."""
+        frame_queue = self._frame_queue
+        writer_stop = self._writer_stop
+        with torch.inference_mode():
+            while True:
+                try:
+                    frame_dict = frame_queue.get(timeout=0.5)
+                except queue.Empty:
+                    if writer_stop.is_set():
+                        return
+                    continue
+                try:
+                    if frame_dict is None:
+                        return
+                    self.dataset.add_frame(frame_dict)
+                    self.frame_idx += 1
+                    if self.frame_idx % 100 == 0:
+                        logger.info(f"Captured {self.frame_idx} frames")
+                except Exception as e:
+                    if self.frame_idx == 0:
+                        logger.error(f"add_frame failed: {e}")
+                finally:
+                    frame_queue.task_done()
 
     def on_episode_boundary(self) -> None:
         """Call this when VR user triggers a reset/new episode."""
         with self._lock:
-            self._save_episode()
-            self.episode_idx += 1
+            # Hold capture so nothing is queued (or added) while the episode
+            # is saved; frames captured so far belong to that episode
+            with self._capture_lock:
+                self._capture_paused = True
+            try:
+                if not self._drain_queue():
+                    logger.error("Writer thread is stuck in add_frame(); episode not saved")
+                    return
+                self._save_episode()
+                self.episode_idx += 1
+            finally:
+                self._capture_paused = False
 
     def _save_episode(self) -> None:
         """Save the current episode using LeRobot v3.0 API."""
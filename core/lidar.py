@@ -4,6 +4,7 @@ Single-point distance measurement (0.2-8m range).
 Supports UART and I2C communication protocols.
 """
 import logging
+import struct
 import threading
 import time
 from typing import Optional
@@ -17,6 +18,14 @@ class TFLunaLidar:
     # TF-Luna frame format (UART): 0x59 0x59 DIST_L DIST_H STRENGTH_L STRENGTH_H TEMP_L TEMP_H CHECKSUM
     HEADER = 0x59
     FRAME_SIZE = 9
+    FRAME_HEADER = bytes((HEADER, HEADER))
+    # DIST, STRENGTH, TEMP (little-endian uint16) + CHECKSUM, after the header
+    FRAME_BODY = struct.Struct('<HHHB')
+    # Bytes per serial read; a 20 ms timeout bounds the wait if fewer arrive
+    READ_CHUNK = 32
+    READ_TIMEOUT = 0.02
+    # Receive buffer reused by every UART read; a larger backlog is skipped
+    RX_BUFFER_SIZE = READ_CHUNK * 8
     
     def __init__(
         self,
@@ -31,6 +40,8 @@ class TFLunaLidar:
         self.i2c_address = i2c_address
         
         self._serial = None
+        self._rx = bytearray(self.RX_BUFFER_SIZE)
+        self._rx_view = memoryview(self._rx)
         self._i2c = None
         self._connected = False
         self._running = False
@@ -71,7 +82,7 @@ class TFLunaLidar:
             self._serial = serial.Serial(
                 port=self.port,
                 baudrate=self.baud_rate,
-                timeout=1.0
+                timeout=self.READ_TIMEOUT
             )
             self._connected = True
             logger.info(f"Lidar: Connected via UART on {self.port} @ {self.baud_rate}")
@@ -136,47 +147,51 @@ class TFLunaLidar:
         if not self._serial:
             return None
         
-        # Clear buffer and find frame start
-        self._serial.reset_input_buffer()
+        serial_port = self._serial
+        rx = self._rx
+        rx_view = self._rx_view
         
-        # Wait for frame header (0x59 0x59)
-        header_count = 0
-        timeout = time.time() + 0.5
+        # Take everything queued (at least one chunk) into the shared buffer
+        # and parse the newest complete frame, instead of discarding the
+        # queue and re-syncing on the header one byte per read() call
+        want = max(serial_port.in_waiting, self.READ_CHUNK)
+        limit = self.RX_BUFFER_SIZE - self.READ_CHUNK
+        if want > limit:
+            # Backlog older than the buffer holds: skip it, only the newest matters
+            serial_port.read(want - limit)
+            want = limit
+        n = serial_port.readinto(rx_view[:want]) or 0
+        frame = self._parse_latest_frame(rx, n)
+        if frame is None:
+            # Chunk ended mid-frame: one more chunk completes it
+            n += serial_port.readinto(rx_view[n:n + self.READ_CHUNK]) or 0
+            frame = self._parse_latest_frame(rx, n)
+            if frame is None:
+                return None
         
-        while time.time() < timeout:
-            byte = self._serial.read(1)
-            if not byte:
-                continue
-            if byte[0] == self.HEADER:
-                header_count += 1
-                if header_count >= 2:
-                    break
-            else:
-                header_count = 0
-        
-        if header_count < 2:
-            return None
-        
-        # Read remaining frame data
-        data = self._serial.read(self.FRAME_SIZE - 2)
-        if len(data) != self.FRAME_SIZE - 2:
-            return None
-        
-        # Parse frame
-        dist_l, dist_h, str_l, str_h, temp_l, temp_h, checksum = data
-        
-        # Verify checksum
-        calc_checksum = (self.HEADER + self.HEADER + sum(data[:-1])) & 0xFF
-        if calc_checksum != checksum:
-            return None
-        
-        # Extract values
+        dist, strength, temp_raw = frame
         with self._lock:
-            self.distance_cm = dist_l + (dist_h << 8)
-            self.strength = str_l + (str_h << 8)
-            self.temperature = (temp_l + (temp_h << 8)) / 8.0 - 256
-        
-        return self.distance_cm
+            self.distance_cm = dist
+            self.strength = strength
+            self.temperature = temp_raw / 8.0 - 256
+        return dist
+    
+    def _parse_latest_frame(self, buf: bytearray, end: int):
+        """Return (distance, strength, raw temperature) of the newest valid frame in buf[:end]."""
+        if end < self.FRAME_SIZE:
+            return None
+        # Last header that still has a full frame after it
+        idx = buf.rfind(self.FRAME_HEADER, 0, end - self.FRAME_SIZE + 2)
+        while idx >= 0:
+            dist, strength, temp_raw, checksum = self.FRAME_BODY.unpack_from(buf, idx + 2)
+            
+            # Verify checksum
+            if sum(buf[idx:idx + self.FRAME_SIZE - 1]) & 0xFF == checksum:
+                return dist, strength, temp_raw
+            
+            # Header bytes inside a payload, or a corrupt frame: try an earlier one
+            idx = buf.rfind(self.FRAME_HEADER, 0, idx + 1)
+        return None
     
     def _read_i2c(self) -> Optional[int]:
         """Read distance from I2C."""
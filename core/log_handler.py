@@ -1,9 +1,36 @@
 
+import bisect
+import itertools
 import logging
 from collections import deque
 from datetime import datetime
 import threading
 
+# Smallest gap between consecutive seq keys (1 microsecond)
+_SEQ_STEP = 1e-6
+
+class LogEntry:
+    """One stored log record; converted to a dict only when served."""
+    __slots__ = ('timestamp', 'level', 'message', 'module', 'created', 'seq')
+
+    def __init__(self, timestamp, level, message, module, created, seq):
+        self.timestamp = timestamp
+        self.level = level
+        self.message = message
+        self.module = module
+        self.created = created  # Raw record time
+        self.seq = seq  # Non-decreasing filter key; pass back as get_logs(since)
+
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp,
+            'level': self.level,
+            'message': self.message,
+            'module': self.module,
+            'created': self.created,
+            'seq': self.seq,
+        }
+
 class CircularLogHandler(logging.Handler):
     """
     A logging handler that stores a fixed number of recent log records in memory.
@@ -14,6 +41,9 @@ class CircularLogHandler(logging.Handler):
         self.capacity = capacity
         # Thread-safe deque with fixed length
         self.records = deque(maxlen=capacity)
+        # Parallel, sorted seq keys so get_logs(since) can bisect; both
+        # deques evict from the left together
+        self._created = deque(maxlen=capacity)
         # Initialize the standard Handler lock
         self.createLock()
         
@@ -21,34 +51,57 @@ class CircularLogHandler(logging.Handler):
         try:
             msg = self.format(record)
             
-            # Create a structured dict for the frontend
-            log_entry = {
-                'timestamp': datetime.fromtimestamp(record.created).strftime('%H:%M:%S'),
-                'level': record.levelname,
-                'message': record.getMessage(), 
-                'module': record.module,
-                'created': record.created  # Raw timestamp for filtering
-            }
+            # record.created is stamped before the lock is taken, so threads
+            # can arrive out of order; the seq key is bumped past the last one
+            # to keep _created strictly increasing for bisect (a reader that
+            # already saw seq N never misses a later record), while the entry
+            # keeps the real time
+            seq = record.created
+            if self._created and seq <= self._created[-1]:
+                seq = self._created[-1] + _SEQ_STEP
+            
+            # Create a structured entry for the frontend
+            log_entry = LogEntry(
+                datetime.fromtimestamp(record.created).strftime('%H:%M:%S'),
+                record.levelname,
+                record.getMessage(),
+                record.module,
+                record.created,
+                seq,
+            )
             
             # emit() is already protected by self.acquire() in the parent handle() method
             # so we can safely modify self.records
             self.records.append(log_entry)
+            self._created.append(seq)
                 
         except Exception:
             self.handleError(record)
 
-    def get_logs(self, since=0):
+    def iter_logs(self, since=0):
         """
-        Get logs created after the 'since' timestamp.
+        Yield logs whose seq is after 'since' as dicts.
+        Only the matching entry references are copied under the lock;
+        dicts are built as the caller consumes them.
         """
         # Use the handler's lock to ensure thread safety during read
         self.acquire()
         try:
-            # If since is 0, return all
+            # If since is 0, take all
             if since == 0:
-                return list(self.records)
-            
-            # Otherwise filter
-            return [r for r in self.records if r['created'] > since]
+                snapshot = tuple(self.records)
+            else:
+                # Otherwise binary-search the first newer record
+                idx = bisect.bisect_right(self._created, since)
+                snapshot = tuple(itertools.islice(self.records, idx, None))
         finally:
             self.release()
+        
+        for entry in snapshot:
+            yield entry.to_dict()
+
+    def get_logs(self, since=0):
+        """
+        Get logs whose seq is after 'since' (the last entry's 'seq').
+        """
+        return list(self.iter_logs(since))
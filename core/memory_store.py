@@ -7,10 +7,76 @@ import sqlite3
 import threading
 import time
 import os
-from typing import List, Dict
+import hashlib
+import queue
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'arcs_memory.db')
 
+# WAL lets readers run alongside the writer; it is stored in the database
+# file, so it is set once at startup rather than on every connection
+_PRAGMA_WAL = "PRAGMA journal_mode=WAL"
+# Per-connection tuning: with WAL, synchronous=NORMAL commits skip the
+# per-transaction fsync
+_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+)
+# Run PRAGMA optimize after this many saved notes
+_OPTIMIZE_EVERY = 100
+# Most connections open at once; callers beyond this wait for a free one,
+# for at most _POOL_TIMEOUT seconds
+_POOL_SIZE = 4
+_POOL_TIMEOUT = 30.0
+
+# Statement text shared by every call, so each connection's prepared
+# statement cache (sqlite3 default: 128 entries) hits on it
+_SQL_INSERT = 'INSERT INTO notes (created_at, category, content, location_x, location_y, summary) VALUES (?, ?, ?, ?, ?, ?)'
+_SQL_GET_RECENT = 'SELECT id, category, content, location_x, location_y FROM notes ORDER BY created_at DESC LIMIT ?'
+_SQL_GET_BY_CAT = 'SELECT content, location_x, location_y FROM notes WHERE category = ? ORDER BY created_at DESC LIMIT ?'
+_SQL_DELETE = 'DELETE FROM notes WHERE id = ?'
+# Newest N notes grouped per category: the three newest summaries of each
+# category pre-joined in SQL, plus the category's count within those N.
+# Output order is fixed (category name, then id) so the same notes always
+# give the same text, which keeps LLM prompt prefix caches valid.
+_SQL_GET_SUMMARY_GROUPS = '''
+    SELECT category, GROUP_CONCAT(summary, '; ') AS combined, MAX(n) AS n,
+           GROUP_CONCAT(id, ',') AS ids
+    FROM (
+        SELECT id, category, summary,
+               ROW_NUMBER() OVER (PARTITION BY category ORDER BY created_at DESC, id DESC) AS rn,
+               COUNT(*) OVER (PARTITION BY category) AS n
+        FROM (SELECT id, category, summary, created_at FROM notes
+              ORDER BY created_at DESC, id DESC LIMIT ?)
+        ORDER BY category, id
+    )
+    WHERE rn <= 3
+    GROUP BY category
+    ORDER BY category
+'''
+
+# Longest note text put into the AI prompt; longer notes are cut down
+_SUMMARY_MAX_CHARS = 120
+
+
+def _summarize_note(content: str, max_chars: int = _SUMMARY_MAX_CHARS) -> str:
+    """Bound a note for the prompt, preferring a sentence or word boundary."""
+    if len(content) <= max_chars:
+        return content
+    head = content[:max_chars]
+    # Keep whole sentences if one ends in the second half, else whole words
+    cut = max(head.rfind('. '), head.rfind('! '), head.rfind('? '), head.rfind('; '))
+    if cut >= max_chars // 2:
+        return head[:cut + 1]
+    cut = head.rfind(' ')
+    if cut >= max_chars // 2:
+        head = head[:cut]
+    return head.rstrip(' ,;:') + '…'
+
 class MemoryStore:
     _instance = None
     _lock = threading.Lock()
@@ -31,94 +97,226 @@ class MemoryStore:
     
     def _init_db(self):
         """Initialize the SQLite database."""
-        db_path = os.path.abspath(DB_PATH)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self._db_lock = threading.Lock()
+        self._db_path = os.path.abspath(DB_PATH)
+        # Small shared pool: SQLite (in WAL mode) serializes writers and lets
+        # readers run concurrently, so connections are lent out, not locked
+        self._pool = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._open_count = 0
+        # Guards the counters below, which are bumped from any thread
+        self._state_lock = threading.Lock()
+        self._saves_since_optimize = 0
+        # Bumped after every committed change; generate_context_summary()
+        # reuses its last result while this is unchanged
+        self._version = 0
+        self._summary_cache = (None, None, "")
         
-        with self._db_lock:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS notes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    created_at REAL NOT NULL,
-                    category TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    location_x REAL,
-                    location_y REAL
+        with self._connection() as conn:
+            conn.execute(_PRAGMA_WAL)
+            self._create_schema(conn)
+    
+    def _create_schema(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                category TEXT NOT NULL,
+                content TEXT NOT NULL,
+                location_x REAL,
+                location_y REAL,
+                summary TEXT
+            )
+        ''')
+        # (category, created_at) serves get_notes_by_category's filter and
+        # ORDER BY straight from the index; it supersedes the category-only one
+        cursor.execute('DROP INDEX IF EXISTS idx_notes_category')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_cat_time ON notes(category, created_at DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_created ON notes(created_at DESC)')
+        conn.commit()
+        self._migrate_summary_column(conn)
+        cursor.execute('ANALYZE notes')
+        conn.commit()
+    
+    def _migrate_summary_column(self, conn: sqlite3.Connection):
+        """Add and backfill the per-note prompt summary on databases that predate it."""
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(notes)')}
+        if 'summary' not in columns:
+            conn.execute('ALTER TABLE notes ADD COLUMN summary TEXT')
+        rows = conn.execute('SELECT id, content FROM notes WHERE summary IS NULL').fetchall()
+        if rows:
+            with conn:
+                conn.executemany(
+                    'UPDATE notes SET summary = ? WHERE id = ?',
+                    [(_summarize_note(content), note_id) for note_id, content in rows]
                 )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_category ON notes(category)')
-            self.conn.commit()
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        # Pooled connections move between threads, one borrower at a time
+        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            for pragma in _PRAGMAS:
+                conn.execute(pragma)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+    
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, opening one while under _POOL_SIZE."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._pool_lock:
+                if self._open_count < _POOL_SIZE:
+                    # Counted only once open, so a failed connect frees its slot
+                    conn = self._open_connection()
+                    self._open_count += 1
+            if conn is None:
+                try:
+                    conn = self._pool.get(timeout=_POOL_TIMEOUT)
+                except queue.Empty:
+                    raise sqlite3.OperationalError(
+                        f"No memory store connection free after {_POOL_TIMEOUT:.0f}s"
+                    ) from None
+        try:
+            yield conn
+        finally:
+            # Never hand the next borrower a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+    
+    def _bump_version(self, saved: int = 0) -> bool:
+        """Record a committed change; True when PRAGMA optimize is due."""
+        with self._state_lock:
+            self._version += 1
+            self._saves_since_optimize += saved
+            if self._saves_since_optimize >= _OPTIMIZE_EVERY:
+                self._saves_since_optimize = 0
+                return True
+            return False
+    
+    def close(self):
+        """Close every idle pooled connection."""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._pool_lock:
+                self._open_count -= 1
     
     def save_note(self, category: str, content: str, location: Dict = None) -> int:
         """Save a note to the database."""
         x = location.get('x') if location else None
         y = location.get('y') if location else None
         
-        with self._db_lock:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                'INSERT INTO notes (created_at, category, content, location_x, location_y) VALUES (?, ?, ?, ?, ?)',
-                (time.time(), category, content, x, y)
-            )
-            self.conn.commit()
-            return cursor.lastrowid
+        with self._connection() as conn:
+            cursor = conn.execute(_SQL_INSERT, (time.time(), category, content, x, y, _summarize_note(content)))
+            conn.commit()
+            if self._bump_version(saved=1):
+                conn.execute("PRAGMA optimize")
+        return cursor.lastrowid
+    
+    def save_notes(self, items: List[Tuple[str, str, Optional[Dict]]]) -> int:
+        """Save several (category, content, location) notes in one transaction."""
+        now = time.time()
+        rows = [
+            (now, category, content,
+             location.get('x') if location else None,
+             location.get('y') if location else None,
+             _summarize_note(content))
+            for category, content, location in items
+        ]
+        if not rows:
+            return 0
+        
+        with self._connection() as conn:
+            # One commit (and WAL sync) for the whole batch
+            with conn:
+                conn.executemany(_SQL_INSERT, rows)
+            if self._bump_version(saved=len(rows)):
+                conn.execute("PRAGMA optimize")
+        return len(rows)
+    
+    def update_note(self, note_id: int, category: str = None, content: str = None) -> bool:
+        """Update a note's category and/or content. Returns False if not found."""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            if category and content:
+                cursor.execute('UPDATE notes SET category = ?, content = ?, summary = ? WHERE id = ?',
+                               (category, content, _summarize_note(content), note_id))
+            elif content:
+                cursor.execute('UPDATE notes SET content = ?, summary = ? WHERE id = ?',
+                               (content, _summarize_note(content), note_id))
+            elif category:
+                cursor.execute('UPDATE notes SET category = ? WHERE id = ?', (category, note_id))
+            conn.commit()
+        self._bump_version()
+        return cursor.rowcount > 0
+    
+    def delete_note(self, note_id: int) -> bool:
+        """Delete a note. Returns False if not found."""
+        with self._connection() as conn:
+            cursor = conn.execute(_SQL_DELETE, (note_id,))
+            conn.commit()
+        self._bump_version()
+        return cursor.rowcount > 0
     
     def get_notes(self, limit: int = 20) -> List[Dict]:
         """Get recent notes."""
-        with self._db_lock:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                'SELECT id, category, content, location_x, location_y FROM notes ORDER BY created_at DESC LIMIT ?',
-                (limit,)
-            )
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+        with self._connection() as conn:
+            rows = conn.execute(_SQL_GET_RECENT, (limit,)).fetchall()
+        return [dict(row) for row in rows]
     
     def get_notes_by_category(self, category: str, limit: int = 10) -> List[Dict]:
         """Get notes by category."""
-        with self._db_lock:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                'SELECT content, location_x, location_y FROM notes WHERE category = ? ORDER BY created_at DESC LIMIT ?',
-                (category, limit)
-            )
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+        with self._connection() as conn:
+            rows = conn.execute(_SQL_GET_BY_CAT, (category, limit)).fetchall()
+        return [dict(row) for row in rows]
     
     def generate_context_summary(self, max_notes: int = 15) -> str:
         """Generate a compressed summary of stored notes for the AI prompt."""
-        notes = self.get_notes(limit=max_notes)
-        if not notes:
-            return ""
-        
-        lines = ["PERSISTENT MEMORY:"]
+        # Read the version before querying: a change that lands mid-build
+        # bumps it again, so a stale result is never reused
+        version = self._version
+        cached_version, cached_max, cached_summary = self._summary_cache
+        if cached_version == version and cached_max == max_notes:
+            return cached_summary
         
-        by_category = {}
-        for note in notes:
-            cat = note['category']
-            if cat not in by_category:
-                by_category[cat] = []
-            by_category[cat].append(note['content'])
+        summary = self._build_context_summary(max_notes)
+        self._summary_cache = (version, max_notes, summary)
+        return summary
+    
+    def _build_context_summary(self, max_notes: int) -> str:
+        # Grouping, per-category truncation and joining all happen in SQLite;
+        # only the bounded per-note summaries are read, not the full text
+        with self._connection() as conn:
+            groups = conn.execute(_SQL_GET_SUMMARY_GROUPS, (max_notes,)).fetchall()
+        if not groups:
+            return ""
         
-        for cat, contents in by_category.items():
-            if len(contents) == 1:
-                lines.append(f"  [{cat}] {contents[0]}")
-            else:
-                combined = "; ".join(contents[:3])
-                if len(contents) > 3:
-                    combined += f" (+{len(contents)-3} more)"
-                lines.append(f"  [{cat}] {combined}")
+        # Header tags the pack with the ids it was built from
+        ids = ",".join(g[3] for g in groups)
+        lines = [f"# mempack v={hashlib.md5(ids.encode()).hexdigest()[:8]}", "PERSISTENT MEMORY:"]
+        for cat, combined, count, _ in groups:
+            if count > 3:
+                combined += f" (+{count-3} more)"
+            lines.append(f"  [{cat}] {combined}")
         
         return "\n".join(lines)
     
     def clear_all(self):
         """Clear all notes."""
-        with self._db_lock:
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM notes')
-            self.conn.commit()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM notes')
+            conn.commit()
+        self._bump_version()
 
 
 memory_store = MemoryStore()
@@ -7,12 +7,44 @@ import os
 import sys
 from typing import List, Optional, Dict, Any
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 from langchain.chat_models import init_chat_model
 from core.config_manager import get_config
 
 AI_MIN_BRIGHTNESS = get_config("AI_MIN_BRIGHTNESS")
+AI_IMAGE_FORMAT = get_config("AI_IMAGE_FORMAT")
+
+# Frame sent to the LLM: long edge capped (plenty for visual reasoning) and encoder settings
+LLM_IMAGE_MAX_SIDE = 768
+if AI_IMAGE_FORMAT == "webp":
+    LLM_IMAGE_EXT, LLM_IMAGE_MIME = '.webp', 'image/webp'
+    LLM_IMAGE_PARAMS = [cv2.IMWRITE_WEBP_QUALITY, 75]
+else:
+    LLM_IMAGE_EXT, LLM_IMAGE_MIME = '.jpg', 'image/jpeg'
+    # Optimized Huffman tables + progressive scan: ~5-10% fewer bytes at the same quality
+    LLM_IMAGE_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 75, cv2.IMWRITE_JPEG_OPTIMIZE, 1, cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+# Pixel stride of the view hashed to spot an unchanged frame
+_FRAME_HASH_STRIDE = 8
+
+# History condensation: once the history tail exceeds HISTORY_CONDENSE_AT
+# messages, everything before the last HISTORY_KEEP_RECENT messages is
+# summarized into a single "Research state" message.
+HISTORY_CONDENSE_AT = 12
+HISTORY_KEEP_RECENT = 4
+# Placeholder that replaces image payloads of older steps
+MASKED_IMAGE = {"type": "text", "text": "<MASKED: image too old>"}
+
+CONDENSER_PROMPT = """You compress the history of a mobile robot navigation session.
+Summarize the transcript below into this exact structure, one short line per item, no prose:
+RECENT_ACTIONS: <what the robot did, in order>
+LOCATIONS_VISITED: <rooms, QR locations, landmarks>
+BLOCKERS: <obstacles, blocked actions, stuck situations>
+DECISIONS: <plans and conclusions that still matter for the current task>
+Keep it under 120 words."""
 
 load_dotenv()
 
@@ -30,6 +62,28 @@ from state import state
 from qr_scanner import QRScanner
 from core.robot_system import RobotSystem
 
+@lru_cache(maxsize=64)
+def _find_repeating_pattern(actions: tuple, blocked_count: int) -> Optional[str]:
+    """Pattern check on an immutable action tuple; identical inputs reuse the result."""
+    if len(actions) < 4:
+        return None
+    
+    for pattern_len in (2, 3, 4):
+        if len(actions) < pattern_len * 2:
+            continue
+        
+        pattern = actions[-pattern_len:]
+        
+        if pattern == actions[-(pattern_len * 2):-pattern_len]:
+            if len(actions) >= pattern_len * 3 and actions[-(pattern_len * 3):-(pattern_len * 2)] == pattern:
+                return f"SEVERE: [{' → '.join(pattern)}] repeated 3x"
+            return f"[{' → '.join(pattern)}] repeated"
+    
+    if blocked_count >= 4:
+        return f"{blocked_count} blocked attempts in last 6 actions"
+    
+    return None
+
 class NavigationAgent:
     def __init__(
         self, 
@@ -47,9 +101,12 @@ class NavigationAgent:
         # Initialize LLM - parse model name for provider
         if "/" in model_name:
             provider, model = model_name.split("/", 1)
-            self.llm = init_chat_model(model, model_provider=provider).bind_tools(tools)
+            base_llm = init_chat_model(model, model_provider=provider)
         else:
-            self.llm = init_chat_model(model_name).bind_tools(tools)
+            base_llm = init_chat_model(model_name)
+        self.llm = base_llm.bind_tools(tools)
+        # Tool-free model used to condense old history
+        self.summarizer_llm = base_llm
         
         # System Prompt
         base_prompt = """You are an intelligent mobile robot navigating a real physical environment.
@@ -141,7 +198,9 @@ PERSISTENT NOTES:
 - Example: save_note("layout", "Living room has couch on left, TV on right")
 """
         self.system_prompt = system_prompt or base_prompt
-        self.message_history = [SystemMessage(content=self.system_prompt)]
+        # System prompt is kept apart so the tail can be trimmed from the left in O(1)
+        self.system_message = SystemMessage(content=self.system_prompt)
+        self.history_tail = deque()
         
         # State
         self.current_task = "Idle"
@@ -158,11 +217,22 @@ PERSISTENT NOTES:
         # QR Scanner
         self.qr_scanner = QRScanner()
         self.qr_context = []
+        
+        # QR scan, obstacle detection and the memory lookup are independent and
+        # release the GIL (OpenCV / sqlite3), so each step runs them side by side
+        # (plus one worker for background history condensation)
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="nav-step")
+        # Pending history summary, started once the tail exceeds HISTORY_CONDENSE_AT
+        self._condense_future = None
+        
+        # Last encoded LLM image, reused while the frame is unchanged
+        self._last_frame_hash = None
+        self._last_b64 = None
 
     def set_task(self, task: str):
         """Set a new task for the agent."""
         self.current_task = task
-        self.message_history.append(HumanMessage(content=f"New Task: {task}"))
+        self.history_tail.append(HumanMessage(content=f"New Task: {task}"))
         logger.info(f"Agent task set: {task}")
 
     def _check_safety(self, image: np.ndarray) -> tuple[list, np.ndarray, str, dict]:
@@ -209,7 +279,10 @@ PERSISTENT NOTES:
              logger.warning(f"Failed to list policies for prompt: {e}")
              full_prompt = self.system_prompt
 
-        self.message_history = [SystemMessage(content=full_prompt)]
+        self.system_message = SystemMessage(content=full_prompt)
+        self.history_tail.clear()
+        # A summary still in flight no longer matches the history
+        self._condense_future = None
         self.stuck_counter = 0
         self.last_action = None
         self.current_task = "Idle"
@@ -220,11 +293,15 @@ PERSISTENT NOTES:
 
     def _record_action(self, action_name: str, was_blocked: bool = False):
         """Record an action to the history buffer."""
+        pose = state.pose
         self.action_history.append({
             'action': action_name,
             'time': time.time(),
             'blocked': was_blocked,
-            'pose': state.pose.copy() if state.pose else None
+            # Short form shown in the memory context, e.g. "TLE✗"
+            'str': action_name.replace('move_', '').replace('turn_', 'T').upper()[:3] + ('✗' if was_blocked else '✓'),
+            # Immutable (x, y, theta) snapshot; no dict copy needed
+            'pose': (pose.get('x', 0.0), pose.get('y', 0.0), pose.get('theta', 0.0)) if pose else None
         })
 
     def _detect_repeating_pattern(self) -> Optional[str]:
@@ -232,40 +309,24 @@ PERSISTENT NOTES:
         if len(self.action_history) < 4:
             return None
         
-        actions = [h['action'] for h in self.action_history]
-        
-        for pattern_len in [2, 3, 4]:
-            if len(actions) < pattern_len * 2:
-                continue
-            
-            pattern = actions[-pattern_len:]
-            prev_pattern = actions[-(pattern_len * 2):-pattern_len]
-            
-            if pattern == prev_pattern:
-                if len(actions) >= pattern_len * 3:
-                    prev_prev = actions[-(pattern_len * 3):-(pattern_len * 2)]
-                    if prev_prev == pattern:
-                        return f"SEVERE: [{' → '.join(pattern)}] repeated 3x"
-                return f"[{' → '.join(pattern)}] repeated"
-        
-        blocked_count = sum(1 for h in list(self.action_history)[-6:] if h.get('blocked'))
-        if blocked_count >= 4:
-            return f"{blocked_count} blocked attempts in last 6 actions"
-        
-        return None
+        actions = tuple(h['action'] for h in self.action_history)
+        blocked_count = sum(1 for h in islice(self.action_history, max(len(self.action_history) - 6, 0), None) if h.get('blocked'))
+        return _find_repeating_pattern(actions, blocked_count)
 
-    def _generate_memory_context(self) -> str:
+    def _generate_memory_context(self, pattern: Optional[str] = None, persistent: Optional[str] = None) -> str:
         """Generate compressed text summary of recent actions and context."""
+        # Fixed section order, most stable first: persistent notes, actions,
+        # locations, streak, pattern. Same state gives byte-identical text.
         lines = []
         
+        if persistent is None:
+            persistent = memory_store.generate_context_summary(max_notes=10)
+        if persistent:
+            lines.append(persistent)
+        
         if self.action_history:
-            recent = list(self.action_history)[-8:]
-            action_strs = []
-            for h in recent:
-                name = h['action'].replace('move_', '').replace('turn_', 'T').upper()[:3]
-                suffix = '✗' if h.get('blocked') else '✓'
-                action_strs.append(f"{name}{suffix}")
-            lines.append(f"MEMORY: Recent actions: {', '.join(action_strs)}")
+            recent = islice(self.action_history, max(len(self.action_history) - 8, 0), None)
+            lines.append(f"MEMORY: Recent actions: {', '.join(h['str'] for h in recent)}")
         
         if self.location_history:
             locs = list(self.location_history)[-3:]
@@ -276,23 +337,16 @@ PERSISTENT NOTES:
         if blocked_recent >= 2:
             lines.append(f"MEMORY: Streak: {blocked_recent} blocked in last 5 attempts")
         
-        pattern = self._detect_repeating_pattern()
         if pattern:
             if "SEVERE" in pattern:
                 lines.append(f"⚠️ LOOP DETECTED: {pattern}. MUST try completely different approach!")
             else:
                 lines.append(f"⚠️ Pattern: {pattern}. Consider a different strategy.")
         
-        persistent = memory_store.generate_context_summary(max_notes=10)
-        if persistent:
-            lines.append(persistent)
-        
         return '\n'.join(lines)
 
-    def _check_stuck_condition(self) -> Optional[str]:
+    def _check_stuck_condition(self, pattern: Optional[str] = None) -> Optional[str]:
         """Check if the agent is stuck using pattern analysis."""
-        pattern = self._detect_repeating_pattern()
-        
         if pattern and "SEVERE" in pattern:
             logger.warning(f"Severe loop detected: {pattern}. Forcing intervention.")
             self.pattern_warning_level = 0
@@ -315,6 +369,105 @@ PERSISTENT NOTES:
         
         return None
 
+    @staticmethod
+    def _message_text(msg) -> str:
+        """Textual part of a message for the condenser; images are left out."""
+        content = msg.content
+        if isinstance(content, list):
+            text = " ".join(
+                part.get("text", "") for part in content
+                if isinstance(part, dict) and part.get("type") == "text"
+            )
+        else:
+            text = str(content)
+        tool_calls = getattr(msg, "tool_calls", None)
+        if tool_calls:
+            calls = ", ".join(f"{c['name']}({c['args']})" for c in tool_calls)
+            text = f"{text} [calls: {calls}]" if text else f"[calls: {calls}]"
+        return text
+
+    def _start_condense(self):
+        """Summarize older history on the pool; _apply_condensed swaps it in on a later step."""
+        if self._condense_future is not None:
+            return
+        keep_from = len(self.history_tail) - HISTORY_KEEP_RECENT
+        # Never start the tail with a ToolMessage cut off from its tool call
+        while keep_from > 0 and isinstance(self.history_tail[keep_from], ToolMessage):
+            keep_from -= 1
+        if keep_from <= 0:
+            return
+        # The prefix stays in the history until its summary is ready
+        prefix = list(islice(self.history_tail, keep_from))
+        transcript = "\n".join(
+            f"{msg.type.upper()}: {self._message_text(msg)}" for msg in prefix
+        )
+        self._condense_future = self._pool.submit(self._summarize_history, prefix, transcript)
+
+    def _summarize_history(self, prefix, transcript):
+        try:
+            summary = self.summarizer_llm.invoke([
+                SystemMessage(content=CONDENSER_PROMPT),
+                HumanMessage(content=transcript),
+            ]).content
+        except Exception as e:
+            # Fall back to plain truncation rather than failing the step
+            logger.warning(f"History condensation failed: {e}")
+            summary = None
+        return prefix, summary
+
+    def _apply_condensed(self):
+        """Replace the summarized prefix with its summary once the background call is done."""
+        future = self._condense_future
+        if future is None or not future.done():
+            return
+        self._condense_future = None
+        prefix, summary = future.result()
+        # Only appends happen at the right, so the prefix is still at the left
+        # unless the history was reset meanwhile
+        if len(self.history_tail) < len(prefix) or any(
+            a is not b for a, b in zip(self.history_tail, prefix)
+        ):
+            return
+        for _ in prefix:
+            self.history_tail.popleft()
+        if summary:
+            # A user turn, not a SystemMessage: several providers reject
+            # system messages after the leading one
+            self.history_tail.appendleft(HumanMessage(content=f"Research state (summary of earlier steps):\n{summary}"))
+        logger.debug(f"Condensed {len(prefix)} history messages")
+
+    def _mask_old_images(self):
+        """Replace image payloads of all but the newest message with a text placeholder."""
+        for msg in islice(self.history_tail, max(len(self.history_tail) - 1, 0)):
+            if not isinstance(msg, HumanMessage) or not isinstance(msg.content, list):
+                continue
+            if any(isinstance(part, dict) and part.get("type") == "image_url" for part in msg.content):
+                msg.content = [
+                    MASKED_IMAGE if isinstance(part, dict) and part.get("type") == "image_url" else part
+                    for part in msg.content
+                ]
+
+    def _encode_frame(self, display_frame: np.ndarray) -> str:
+        """Encode+base64 the frame for the LLM, reusing the last result if it is unchanged."""
+        # Subsampled view: a cheap fingerprint that still catches any real motion
+        frame_hash = hash(display_frame[::_FRAME_HASH_STRIDE, ::_FRAME_HASH_STRIDE].tobytes())
+        if frame_hash == self._last_frame_hash and self._last_b64 is not None:
+            return self._last_b64
+        
+        h, w = display_frame.shape[:2]
+        scale = LLM_IMAGE_MAX_SIDE / max(h, w)
+        if scale < 1:
+            display_frame = cv2.resize(
+                display_frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA
+            )
+        
+        _, buffer = cv2.imencode(LLM_IMAGE_EXT, display_frame, LLM_IMAGE_PARAMS)
+        # Base64 output is pure ASCII; the memoryview hands over the encoded bytes without a copy
+        img_base64 = base64.b64encode(memoryview(buffer)).decode('ascii')
+        self._last_frame_hash = frame_hash
+        self._last_b64 = img_base64
+        return img_base64
+
     def step(self) -> str:
         """
         Execute one step of the agent loop.
@@ -339,8 +492,12 @@ PERSISTENT NOTES:
             tts.speak("It is too dark to see.")
             return "Too Dark - Navigation Aborted"
 
-        # QR Scan
-        qr_title, qr_points, qr_new_data = self.qr_scanner.scan(frame, state.pose)
+        # QR Scan, Safety Check and memory lookup run concurrently
+        f_qr = self._pool.submit(self.qr_scanner.scan, frame, state.pose)
+        f_safe = self._pool.submit(self._check_safety, frame)
+        f_mem = self._pool.submit(memory_store.generate_context_summary, 10)
+        
+        qr_title, qr_points, qr_new_data = f_qr.result()
         qr_alert = ""
         
         if qr_new_data:
@@ -350,25 +507,18 @@ PERSISTENT NOTES:
             self.location_history.append({'name': title, 'time': time.time()})
 
         # 2. Safety Check & Processing
-        safe_actions, overlay, guidance, metrics = self._check_safety(frame)
+        safe_actions, overlay, guidance, metrics = f_safe.result()
         self.latest_rotation_hint = metrics.get('rotation_hint')
         
         # Draw QR Visuals on Overlay (if overlay exists)
         if overlay is not None and qr_points is not None:
              try:
-                 points = qr_points
-                 if points.ndim == 3 and points.shape[0] == 1:
-                    points = points[0]
-                 
-                 points = points.astype(int)
-                 
-                 for i in range(len(points)):
-                     pt1 = tuple(points[i])
-                     pt2 = tuple(points[(i+1) % len(points)])
-                     cv2.line(overlay, pt1, pt2, (0, 255, 0), 3)
+                 # Any (N, 2) / (1, N, 2) corner layout -> the (N, 1, 2) int32 polylines wants
+                 points = qr_points.reshape(-1, 1, 2).astype(np.int32)
+                 cv2.polylines(overlay, [points], isClosed=True, color=(0, 255, 0), thickness=3)
                  
                  if qr_title:
-                     x, y = points[0]
+                     x, y = points[0, 0]
                      cv2.putText(overlay, qr_title, (int(x), int(y) + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
              except Exception as e:
                  logger.warning(f"Failed to draw QR visuals: {e}")
@@ -376,22 +526,32 @@ PERSISTENT NOTES:
         # Use overlay if available, otherwise raw frame
         display_frame = overlay if overlay is not None else frame
         
-        # 3. Check Stuck Condition
-        forced_action = self._check_stuck_condition()
+        # 3. Check Stuck Condition (pattern is computed once and shared with the prompt)
+        pattern = self._detect_repeating_pattern()
+        forced_action = self._check_stuck_condition(pattern)
+        if forced_action == "FORCE_TURN_AROUND":
+            # Execute hardcoded turn; skip encoding, prompt and LLM entirely
+            logger.info("Executing FORCED TURN AROUND due to stuck condition")
+            if "turn_left" in self.tool_map:
+                self.tool_map["turn_left"].invoke({"angle_degrees": 90})
+            elif "turn_right" in self.tool_map:
+                self.tool_map["turn_right"].invoke({"angle_degrees": 90})
+            
+            self.history_tail.append(SystemMessage(content="System Notification: Stuck detected. Forced 90 degree turn executed to unstuck robot."))
+            return "Stuck Detected - Forced Turn Executed"
         
         # 4. Prepare Prompt
-        _, buffer = cv2.imencode('.jpg', display_frame)
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
+        img_base64 = self._encode_frame(display_frame)
         
         content = [
             {"type": "text", "text": f"Task: {self.current_task}"},
-            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_base64}"}}
+            {"type": "image_url", "image_url": {"url": f"data:{LLM_IMAGE_MIME};base64,{img_base64}"}}
         ]
         
         # Inject Allowed Actions & Warnings
         reflex_msg = f"REFLEX SYSTEM: Allowed actions are {safe_actions}. Green Marked Paths are SAFE. Red Marked Areas are BLOCKED."
         
-        memory_context = self._generate_memory_context()
+        memory_context = self._generate_memory_context(pattern, f_mem.result())
         if memory_context:
             reflex_msg = memory_context + "\n" + reflex_msg
         
@@ -415,10 +575,6 @@ PERSISTENT NOTES:
         # Memory Reminder
         reflex_msg += "\nREMINDER: If you see something new (room, landmark, object), USE `save_note` to record it now."
             
-        if forced_action == "FORCE_TURN_AROUND":
-            reflex_msg += "\nCRITICAL: YOU ARE STUCK. IGNORING YOUR OUTPUT. FORCING A TURN."
-            # Skip LLM to save tokens/time since we are forcing action.
-            
         content.append({
              "type": "text", 
              "text": reflex_msg
@@ -430,31 +586,22 @@ PERSISTENT NOTES:
                 "text": qr_alert
             })
             
-        self.message_history.append(HumanMessage(content=content))
+        self.history_tail.append(HumanMessage(content=content))
 
-        # 5. Forced Intervention or LLM Inference
-        if forced_action == "FORCE_TURN_AROUND":
-             # Execute hardcoded turn
-             logger.info("Executing FORCED TURN AROUND due to stuck condition")
-             if "turn_left" in self.tool_map:
-                 self.tool_map["turn_left"].invoke({"angle_degrees": 90})
-             elif "turn_right" in self.tool_map:
-                 self.tool_map["turn_right"].invoke({"angle_degrees": 90})
-                 
-             self.message_history.append(SystemMessage(content="System Notification: Forced 90 degree turn executed to unstuck robot."))
-             return "Stuck Detected - Forced Turn Executed"
-        
-        # 6. LLM Inference
+        # 5. LLM Inference
+        self._apply_condensed()
         try:
-            response = self.llm.invoke(self.message_history)
-            self.message_history.append(response)
+            # Only the current frame is worth its tokens
+            self._mask_old_images()
+            response = self.llm.invoke([self.system_message, *self.history_tail])
+            self.history_tail.append(response)
             
-            # Prune history very aggressively - images take huge tokens
-            # Keep only system message + last 2 exchanges (4 messages)
-            if len(self.message_history) > 5:
-                self.message_history = [self.message_history[0]] + self.message_history[-4:]
+            # Images take huge tokens - condense older history into a summary.
+            # Runs in the background; the robot acts without waiting for it.
+            if len(self.history_tail) > HISTORY_CONDENSE_AT:
+                self._start_condense()
             
-            # 7. Execute Tools with SAFETY INTERCEPTION
+            # 6. Execute Tools with SAFETY INTERCEPTION
             if response.tool_calls:
                 any_blocked = False
                 
@@ -515,7 +662,7 @@ PERSISTENT NOTES:
                             result = f"Unknown tool: {tool_name}"
                             logger.error(result)
                             
-                    self.message_history.append(ToolMessage(content=str(result), tool_call_id=tool_call["id"]))
+                    self.history_tail.append(ToolMessage(content=str(result), tool_call_id=tool_call["id"]))
 
                 return f"Executed {len(response.tool_calls)} actions"
             else:
@@ -1,6 +1,7 @@
 import logging
 import threading
 import time
+import cv2
 import torch
 import numpy as np
 from pathlib import Path
@@ -8,31 +9,212 @@ from typing import Optional
 
 from lerobot.policies.act.modeling_act import ACTPolicy
 from state import state
+from core.config_manager import get_config
 
 logger = logging.getLogger(__name__)
 
 POLICY_ROOT = Path("logs/policies")
 
+# Device probe done once at import; "auto" loads just reuse the answer
+_HAS_CUDA = torch.cuda.is_available()
+_HAS_MPS = hasattr(torch.backends, 'mps') and torch.backends.mps.is_available()
+_DEFAULT_DEVICE = "cuda" if _HAS_CUDA else ("mps" if _HAS_MPS else "cpu")
+POLICY_COMPILE = get_config("POLICY_COMPILE")
+POLICY_PRECISION = get_config("POLICY_PRECISION")
+_HALF_DTYPES = {"fp16": torch.float16, "bf16": torch.bfloat16}
+# select_action calls on dummy inputs before the real-time loop starts
+WARMUP_RUNS = 2
+# Arm joint read-back rate while a policy runs (50Hz, faster than the 20Hz loop)
+ARM_POLL_INTERVAL = 0.02
+# Longest a tick waits for a camera frame newer than the last one used
+# (about one frame at 30fps), and how often it checks meanwhile
+FRAME_WAIT_TIMEOUT = 0.035
+FRAME_WAIT_POLL = 0.002
+
+MAIN_IMAGE_KEY = "observation.images.main"
+RIGHT_IMAGE_KEY = "observation.images.right"
+STATE_KEY = "observation.state"
+# Buffer key for main+right frames uploaded together when their sizes match
+STEREO_KEY = "stereo"
+# Order of the state and action vectors
+JOINT_NAMES = ("shoulder_pan", "shoulder_lift", "elbow_flex", "wrist_flex", "wrist_roll", "gripper")
+
 class PolicyExecutor:
     def __init__(self):
         self.policy: Optional[ACTPolicy] = None
         self.device = "cpu"
+        # Dtype of the policy weights and of every float input tensor
+        self.dtype = torch.float32
+        # Layout of the image inputs; channels_last (NHWC) on CUDA
+        self.memory_format = torch.contiguous_format
         self.is_running = False
         self.thread = None
+        self.poll_thread = None
         self.current_policy_name = None
+        # Latest arm joint reading, published by the poll thread; a plain
+        # reference swap, so the inference loop reads it without a lock
+        self._arm_pos = None
+        # state.frame_id of the last frame fed to the policy
+        self._last_frame_id = None
         self._lock = threading.Lock()
+        # Input tensors reused every tick, keyed by batch key. Host staging
+        # tensors are pinned on CUDA so uploads can be DMA'd with non_blocking copies.
+        self._buffers = {}
+        self._batch = {}
+        # Image size (width, height) each camera key is resized to: the size
+        # the policy was trained on, from its config
+        self._input_sizes = {}
+        # CUDA only: pinned action readback and the side stream that copies into it
+        self._action_host = None
+        self._copy_stream = None
+        # Arm target handed to set_arm_position, refilled in place each tick
+        self._target_pos = dict.fromkeys(JOINT_NAMES, 0.0)
+
+    def _alloc_pair(self, shape):
+        """Host float32 / device self.dtype input pair; on CPU (always fp32) both are one tensor."""
+        host = torch.empty(shape, dtype=torch.float32, pin_memory=(self.device == "cuda"))
+        if self.device == "cpu":
+            return host, host
+        return host, torch.empty(shape, dtype=self.dtype, device=self.device)
+
+    def _reset_buffers(self):
+        self._buffers = {STATE_KEY: self._alloc_pair((1, len(JOINT_NAMES)))}
+        self._batch = {STATE_KEY: self._buffers[STATE_KEY][1]}
+        # numpy view of the (pinned) float32 state tensor, filled directly each tick
+        self._state_np = self._buffers[STATE_KEY][0].numpy()
+        self._action_host = None
+        self._copy_stream = torch.cuda.Stream() if self.device == "cuda" else None
+
+    def _alloc_images(self, count, height, width):
+        """(host uint8 NHWC, its numpy view, device uint8 NHWC or None on CPU, NCHW input)."""
+        img = torch.empty((count, 3, height, width), dtype=self.dtype, device=self.device,
+                          memory_format=self.memory_format)
+        host_u8 = torch.empty((count, height, width, 3), dtype=torch.uint8, pin_memory=(self.device == "cuda"))
+        dev_u8 = None if self.device == "cpu" else torch.empty_like(host_u8, device=self.device)
+        return host_u8, host_u8.numpy(), dev_u8, img
+
+    def _input_size(self, key, frame):
+        return self._input_sizes.get(key) or (frame.shape[1], frame.shape[0])
+
+    def _upload_images(self, key, frames, size):
+        """Resize/normalize HWC uint8 frames into one reused (N, 3, H, W) input tensor."""
+        width, height = size
+        shape = (len(frames), 3, height, width)
+        bufs = self._buffers.get(key)
+        if bufs is None or tuple(bufs[3].shape) != shape:
+            bufs = self._buffers[key] = self._alloc_images(len(frames), height, width)
+        host_u8, host_np, dev_u8, img = bufs
+        for i, frame in enumerate(frames):
+            if frame.shape[0] != height or frame.shape[1] != width:
+                # SIMD resize straight into the (pinned) staging slot
+                cv2.resize(frame, size, dst=host_np[i], interpolation=cv2.INTER_AREA)
+                src = host_u8[i]
+            elif dev_u8 is not None:
+                np.copyto(host_np[i], frame)
+                continue
+            else:
+                src = torch.from_numpy(frame)
+            if dev_u8 is None:
+                # CPU: normalize each frame in place, no upload
+                torch.div(src.permute(2, 0, 1), 255.0, out=img[i])
+        if dev_u8 is not None:
+            # One upload of the raw uint8 bytes (a quarter of float32), then
+            # cast, scale and NHWC -> NCHW in one kernel on the device
+            dev_u8.copy_(host_u8, non_blocking=True)
+            torch.div(dev_u8.permute(0, 3, 1, 2), 255.0, out=img)
+        return img
+
+    def _input_shapes(self):
+        """{input key: shape without batch dim} from the policy config (old and new lerobot)."""
+        config = self.policy.config
+        features = getattr(config, "input_features", None) or getattr(config, "input_shapes", None) or {}
+        return {key: tuple(getattr(feature, "shape", feature)) for key, feature in features.items()}
+
+    def _policy_image_sizes(self):
+        """{image key: (width, height)} the policy was trained on."""
+        return {
+            key: (shape[2], shape[1]) for key, shape in self._input_shapes().items()
+            if key.startswith("observation.images.") and len(shape) == 3
+        }
+
+    def _download_action(self, action_chunk):
+        """Action vector as numpy, syncing only on its own small D2H copy on CUDA."""
+        action = action_chunk[0]
+        stream = self._copy_stream
+        if stream is None:
+            return action.cpu().numpy()
+        host = self._action_host
+        if host is None or host.shape != action.shape:
+            host = self._action_host = torch.empty(action.shape, dtype=action.dtype, pin_memory=True)
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            # Keep the allocator from reusing the action's memory while the copy runs
+            action.record_stream(stream)
+            host.copy_(action, non_blocking=True)
+            done = stream.record_event()
+        done.synchronize()
+        return host.numpy()
 
-    def load_policy(self, policy_name: str, device: str = "auto"):
+    def _apply_precision(self, precision):
+        """Cast or quantize the loaded policy; inputs follow via self.dtype."""
+        if precision == "auto":
+            # Reduced precision changes the joint targets sent to the arm,
+            # so it is only ever used when asked for explicitly
+            precision = "fp32"
+        self.dtype = torch.float32
+        if precision in _HALF_DTYPES and self.device != "cpu":
+            # Halves weight bandwidth and runs the matmuls/convs on tensor cores
+            self.dtype = _HALF_DTYPES[precision]
+            self.policy.to(self.dtype)
+            logger.warning(f"Policy running in {precision}: actions may differ slightly from fp32")
+        elif precision == "int8" and self.device == "cpu":
+            # Dynamic int8 Linear layers; activations and inputs stay float32
+            self.policy = torch.ao.quantization.quantize_dynamic(
+                self.policy, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        elif precision != "fp32":
+            logger.warning(f"Precision '{precision}' not supported on {self.device}, using fp32")
+            precision = "fp32"
+        logger.info(f"Policy precision: {precision}")
+
+    def _compile_policy(self):
+        """torch.compile the network behind select_action (the action queue stays eager)."""
+        # On CUDA, "reduce-overhead" records the forward into CUDA graphs and
+        # replays them; input shapes are fixed, so the graphs are reused every tick
+        mode = "reduce-overhead" if self.device == "cuda" else None
+        try:
+            self.policy.model = torch.compile(self.policy.model, dynamic=False, mode=mode)
+            logger.info(f"Policy model compiled (mode={mode or 'default'})")
+        except Exception as e:
+            logger.warning(f"torch.compile unavailable, running eager: {e}")
+
+    def _warmup(self):
+        """Run select_action on zero inputs so compilation/autotuning happens before the loop."""
+        batch = {}
+        for key, shape in self._input_shapes().items():
+            shape = (1, *shape)
+            tensor = torch.zeros(shape, dtype=self.dtype, device=self.device)
+            # Same layout as the real image inputs, so compiled graphs are reused
+            batch[key] = tensor.contiguous(memory_format=self.memory_format) if len(shape) == 4 else tensor
+        if not batch:
+            return
+        try:
+            with torch.inference_mode():
+                for _ in range(WARMUP_RUNS):
+                    # Empty action queue, so every run goes through the model
+                    self.policy.reset()
+                    self.policy.select_action(batch)
+        except Exception as e:
+            logger.warning(f"Policy warm-up failed: {e}")
+        finally:
+            self.policy.reset()
+
+    def load_policy(self, policy_name: str, device: str = "auto", precision: Optional[str] = None):
         policy_path = POLICY_ROOT / policy_name / "checkpoints" / "last" / "pretrained_model"
         
         # Auto-detect device
         if device == "auto" or not device:
-            if torch.cuda.is_available():
-                device = "cuda"
-            elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-                device = "mps"
-            else:
-                device = "cpu"
+            device = _DEFAULT_DEVICE
         
         # Check if local path exists
         if policy_path.exists():
@@ -49,6 +231,19 @@ class PolicyExecutor:
             self.policy.eval()
             self.current_policy_name = policy_name
             self.device = device
+            self._apply_precision(precision or POLICY_PRECISION)
+            if device == "cuda":
+                # cuDNN's tensor-core convolutions prefer NHWC; with NHWC inputs the
+                # normalize kernel below is also a straight copy of the uint8 frame
+                self.memory_format = torch.channels_last
+                self.policy.to(memory_format=torch.channels_last)
+            else:
+                self.memory_format = torch.contiguous_format
+            self._reset_buffers()
+            self._input_sizes = self._policy_image_sizes()
+            if POLICY_COMPILE:
+                self._compile_policy()
+            self._warmup()
             logger.info("Policy loaded successfully")
             return True
         except Exception as e:
@@ -68,6 +263,10 @@ class PolicyExecutor:
             state.ai_enabled = True
             state.ai_status = f"Running Policy: {self.current_policy_name}"
             
+            self._arm_pos = None
+            self._last_frame_id = None
+            self.poll_thread = threading.Thread(target=self._arm_poll_loop, daemon=True)
+            self.poll_thread.start()
             self.thread = threading.Thread(target=self._inference_loop, daemon=True)
             self.thread.start()
             return True
@@ -76,11 +275,95 @@ class PolicyExecutor:
         self.is_running = False
         if self.thread:
             self.thread.join(timeout=2.0)
+        if self.poll_thread:
+            self.poll_thread.join(timeout=2.0)
         with self._lock:
             state.ai_enabled = False
             state.stop_all_movement()
         return True
 
+    def _arm_poll_loop(self):
+        """Read arm joints off the servo bus so the inference loop never waits on it."""
+        while self.is_running:
+            controller = state.controller
+            if controller:
+                try:
+                    pos = controller.get_arm_position()
+                    # {} means the bus read failed: keep the last good reading
+                    if pos:
+                        self._arm_pos = pos
+                except Exception as e:
+                    logger.debug(f"Arm poll failed: {e}")
+            time.sleep(ARM_POLL_INTERVAL)
+
+    def _tick(self):
+        """One control step: observe, run the policy, command the arm."""
+        # Read the shared globals once per tick
+        robot_system = state.robot_system
+        controller = state.controller
+        if not robot_system:
+            time.sleep(0.1)
+            return
+
+        # Latency over throughput: only act on frames not seen yet, never
+        # re-run the policy on an old observation after an overrun
+        frame_id = state.frame_id
+        if frame_id == self._last_frame_id:
+            # The camera is just behind the tick grid: wait briefly for its
+            # next frame instead of giving up the whole period
+            wait_until = time.perf_counter() + FRAME_WAIT_TIMEOUT
+            while frame_id == self._last_frame_id:
+                if time.perf_counter() >= wait_until:
+                    return
+                time.sleep(FRAME_WAIT_POLL)
+                frame_id = state.frame_id
+        frame_main = robot_system.get_frame()
+        if frame_main is None:
+            return
+        self._last_frame_id = frame_id
+        
+        batch = self._batch
+        
+        # Check for right camera
+        frame_right = robot_system.get_right_frame()
+        main_size = self._input_size(MAIN_IMAGE_KEY, frame_main)
+        right_size = self._input_size(RIGHT_IMAGE_KEY, frame_right) if frame_right is not None else None
+        if right_size == main_size:
+            # Both cameras in one transfer and one normalize kernel
+            images = self._upload_images(STEREO_KEY, (frame_main, frame_right), main_size)
+            batch[MAIN_IMAGE_KEY] = images[0:1]
+            batch[RIGHT_IMAGE_KEY] = images[1:2]
+        else:
+            batch[MAIN_IMAGE_KEY] = self._upload_images(MAIN_IMAGE_KEY, (frame_main,), main_size)
+            if frame_right is not None:
+                batch[RIGHT_IMAGE_KEY] = self._upload_images(RIGHT_IMAGE_KEY, (frame_right,), right_size)
+            else:
+                batch.pop(RIGHT_IMAGE_KEY, None)
+        
+        if not controller:
+            return
+        
+        arm_pos = self._arm_pos
+        if arm_pos is None:
+            # No joint reading yet
+            return
+        self._state_np[0] = [arm_pos.get(name, 0) for name in JOINT_NAMES]
+        state_host, state_dev = self._buffers[STATE_KEY]
+        if state_dev is not state_host:
+            state_dev.copy_(state_host, non_blocking=True)
+        
+        # select_action handles temporal ensembling internally
+        action_chunk = self.policy.select_action(batch)
+        
+        action = self._download_action(action_chunk)
+        
+        # set_arm_position copies the values, so the dict can be reused
+        target_pos = self._target_pos
+        for name, value in zip(JOINT_NAMES, action.tolist()):
+            target_pos[name] = value
+        
+        controller.set_arm_position(target_pos)
+
     def _inference_loop(self):
         dt = 0.05 # 20Hz
         try:
@@ -88,75 +371,27 @@ class PolicyExecutor:
         except:
             pass # Some policies don't need reset
         
-        while self.is_running:
-            loop_start = time.time()
-            
-            try:
-                if not state.robot_system:
-                    time.sleep(0.1)
-                    continue
-
-                frame_main = state.robot_system.get_frame()
-                if frame_main is None:
-                    continue
-                    
-                img_tensor = torch.from_numpy(frame_main).permute(2, 0, 1).float() / 255.0
-                img_tensor = img_tensor.unsqueeze(0).to(self.device)
-                
-                # Check for right camera
-                frame_right = state.robot_system.get_right_frame()
-                img_right_tensor = None
-                if frame_right is not None:
-                    img_right_tensor = torch.from_numpy(frame_right).permute(2, 0, 1).float() / 255.0
-                    img_right_tensor = img_right_tensor.unsqueeze(0).to(self.device)
-                
-                if not state.controller:
-                     continue
-                     
-                arm_pos = state.controller.get_arm_position()
-                current_joints = [
-                    arm_pos.get('shoulder_pan', 0),
-                    arm_pos.get('shoulder_lift', 0),
-                    arm_pos.get('elbow_flex', 0),
-                    arm_pos.get('wrist_flex', 0),
-                    arm_pos.get('wrist_roll', 0),
-                    arm_pos.get('gripper', 0)
-                ]
-                state_tensor = torch.tensor(current_joints, dtype=torch.float32).unsqueeze(0).to(self.device)
-
-                batch = {
-                    "observation.images.main": img_tensor,
-                    "observation.state": state_tensor
-                }
-                
-                if img_right_tensor is not None:
-                    batch["observation.images.right"] = img_right_tensor
+        # Pure inference thread: no autograd for the whole loop, entered once
+        torch.set_grad_enabled(False)
+        # Absolute deadlines on the monotonic clock: no drift from wall-clock
+        # jumps or from the time spent inside each tick
+        next_tick = time.perf_counter()
+        with torch.inference_mode():
+            while self.is_running:
+                try:
+                    self._tick()
+                except Exception as e:
+                    logger.error(f"Inference Loop Error: {e}")
+                    # Back off ~1s to prevent tight loop error spam, staying on the tick grid
+                    next_tick += 1.0 - dt
                 
-                with torch.inference_mode():
-                    # select_action handles temporal ensembling internally
-                    action_chunk = self.policy.select_action(batch) 
-                
-                action = action_chunk.squeeze(0).cpu().numpy()
-                
-                target_pos = {
-                    'shoulder_pan': action[0],
-                    'shoulder_lift': action[1],
-                    'elbow_flex': action[2],
-                    'wrist_flex': action[3],
-                    'wrist_roll': action[4],
-                    'gripper': action[5]
-                }
-                
-                if state.controller:
-                    state.controller.set_arm_position(target_pos)
-            
-            except Exception as e:
-                logger.error(f"Inference Loop Error: {e}")
-                time.sleep(1.0) # Prevent tight loop error spam
-
-            elapsed = time.time() - loop_start
-            sleep_time = max(0, dt - elapsed)
-            time.sleep(sleep_time)
+                next_tick += dt
+                sleep_time = next_tick - time.perf_counter()
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+                else:
+                    # Overran: restart the schedule instead of bursting to catch up
+                    next_tick = time.perf_counter()
 
 # Singleton
 policy_executor = PolicyExecutor()
@@ -17,7 +17,6 @@ class RobotSystem:
     def __init__(self):
         self.robot: Optional[BaseRobot] = None
         self.camera = None
-        self.camera_lock = threading.Lock()
         self.running = True
         
         # Start hardware initialization in background to allow UI to load
@@ -95,25 +94,20 @@ class RobotSystem:
         return None
 
     def get_frame(self):
-        if hasattr(state, 'latest_frame') and state.latest_frame is not None:
-             return state.latest_frame
-             
-        if not self.camera:
-            return None
-        with self.camera_lock:
-            try:
-                ret, frame = self.camera.read()
-                if ret:
-                    return frame
-            except Exception:
-                pass
-            return None
+        """Latest main camera frame, or None until the capture thread has one.
+
+        camera.py's per-camera capture thread owns the device and publishes
+        into state.latest_frame; reading the device here as well would race
+        it and block the caller on USB I/O. The thread decodes into a small
+        ring of reused buffers, so callers get their own copy.
+        """
+        frame = getattr(state, 'latest_frame', None)
+        return None if frame is None else frame.copy()
 
     def get_right_frame(self):
-        """Get the latest frame from the right camera."""
-        if hasattr(state, 'latest_frame_right') and state.latest_frame_right is not None:
-             return state.latest_frame_right
-        return None
+        """Get a copy of the latest frame from the right camera."""
+        frame = getattr(state, 'latest_frame_right', None)
+        return None if frame is None else frame.copy()
 
     def cleanup(self):
         """Release resources."""
@@ -30,7 +30,8 @@ def get_hf_username(force_refresh: bool = False) -> Optional[str]:
     """Get the current HuggingFace username from the logged-in account (cached)."""
     global _hf_username_cache, _hf_username_cache_time
     
-    now = time.time()
+    # Monotonic so a wall-clock step can't pin or expire the cache early
+    now = time.monotonic()
     if not force_refresh and _hf_username_cache is not None and (now - _hf_username_cache_time < _HF_USERNAME_CACHE_TTL):
         return _hf_username_cache
 
@@ -45,6 +46,13 @@ def get_hf_username(force_refresh: bool = False) -> Optional[str]:
         # Don't cache failure, but also don't immediately clear old cache on network error
         return _hf_username_cache
 
+
+def clear_hf_username_cache() -> None:
+    """Forget the cached HuggingFace username (e.g. after logout)."""
+    global _hf_username_cache, _hf_username_cache_time
+    _hf_username_cache = None
+    _hf_username_cache_time = 0
+
 class TrainingManager:
     def __init__(self):
         self.process = None
@@ -676,13 +684,13 @@ class TrainingManager:
 
     def hf_logout(self) -> tuple:
         """Logout from HuggingFace."""
-        global _hf_username_cache, _hf_policies_cache
+        global _hf_policies_cache
         try:
             cmd = ["huggingface-cli", "logout"]
             res = subprocess.run(cmd, capture_output=True, text=True)
             if res.returncode == 0:
                 # Clear cache on logout
-                _hf_username_cache = None
+                clear_hf_username_cache()
                 _hf_policies_cache = []
                 return True, "Logged out"
             else:
@@ -45,6 +45,12 @@ ARM_LIMITS = {
     "gripper": (-65, 95),
 }
 
+# joint name -> (motor id, min angle, max angle), resolved once for set_arm_position
+_ARM_TARGETS = {
+    joint_name: (motor_id, *ARM_LIMITS.get(joint_name, (-180, 180)))
+    for joint_name, motor_id in ARM_SERVO_MAP.items()
+}
+
 
 
 
@@ -377,10 +383,10 @@ class ServoControler:
         
         payload = {}
         for joint_name, angle in positions.items():
-            if joint_name in ARM_SERVO_MAP:
-                motor_id = ARM_SERVO_MAP[joint_name]
-                limits = ARM_LIMITS.get(joint_name, (-180, 180))
-                clamped = max(limits[0], min(limits[1], float(angle)))
+            target = _ARM_TARGETS.get(joint_name)
+            if target is not None:
+                motor_id, lo, hi = target
+                clamped = max(lo, min(hi, float(angle)))
                 payload[motor_id] = clamped
                 self._arm_positions[joint_name] = clamped
         
@@ -10,7 +10,7 @@ from flask import Blueprint, Response, jsonify, request, render_template, redire
 from functools import wraps
 
 from state import state
-from camera import generate_frames, generate_frames_right
+from camera import generate_frames, generate_frames_right, STREAM_MAX_FPS
 from movement import execute_movement
 from arm import arm_controller
 import tts
@@ -38,6 +38,13 @@ PUBLIC_PATHS = [
 ]
 
 
+def _mjpeg_response(frames) -> Response:
+    # direct_passthrough hands the generator to the server untouched, so each
+    # multipart chunk is written as-is without Werkzeug's per-chunk encoding
+    return Response(frames, mimetype='multipart/x-mixed-replace; boundary=frame',
+                    direct_passthrough=True)
+
+
 def get_token_from_request() -> Optional[str]:
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
     if not token:
@@ -192,12 +199,12 @@ def get_status():
 
 @bp.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return _mjpeg_response(generate_frames())
 
 
 @bp.route('/video_feed_right')
 def video_feed_right():
-    return Response(generate_frames_right(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return _mjpeg_response(generate_frames_right())
 
 
 @bp.route('/api/logs')
@@ -567,6 +574,8 @@ def generate_cv_frames():
     # Pre-generate fallback frames
     STREAM_WIDTH = 640
     STREAM_HEIGHT = 480
+    # Same per-client cap as the camera streams; the detector caches per camera frame
+    FRAME_PERIOD = 1.0 / STREAM_MAX_FPS
     
     error_frame = np.zeros((STREAM_HEIGHT, STREAM_WIDTH, 3), np.uint8)
     cv2.putText(error_frame, "AI VISION: NO SIGNAL", (20, STREAM_HEIGHT//2), 
@@ -578,6 +587,7 @@ def generate_cv_frames():
     yield (b'--frame\r\n'
            b'Content-Type: image/jpeg\r\n\r\n' + error_bytes + b'\r\n')
 
+    deadline = time.monotonic()
     while state.running:
         if state.robot_system is None:
             time.sleep(1)
@@ -616,13 +626,21 @@ def generate_cv_frames():
             _, buffer = cv2.imencode('.jpg', overlay, [cv2.IMWRITE_JPEG_QUALITY, 70])
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+
+            # Monotonic deadline instead of spinning: consistent cap, no drift
+            deadline += FRAME_PERIOD
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(deadline - now)
+            else:
+                deadline = now
         except Exception as e:
             time.sleep(0.05)
 
 
 @bp.route('/ai_video_feed')
 def ai_video_feed():
-    return Response(generate_cv_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return _mjpeg_response(generate_cv_frames())
 
 
 @bp.route('/memory')
@@ -649,12 +667,7 @@ def add_memory():
 
 @bp.route('/api/memory/<int:note_id>', methods=['DELETE'])
 def delete_memory(note_id):
-    with memory_store._db_lock:
-        cursor = memory_store.conn.cursor()
-        cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
-        memory_store.conn.commit()
-        deleted = cursor.rowcount > 0
-    if deleted:
+    if memory_store.delete_note(note_id):
         return jsonify({'status': 'ok'})
     return jsonify({'status': 'error', 'error': 'Note not found'}), 404
 
@@ -666,18 +679,7 @@ def update_memory(note_id):
     category = data.get('category')
     content = data.get('content')
     
-    with memory_store._db_lock:
-        cursor = memory_store.conn.cursor()
-        if category and content:
-            cursor.execute('UPDATE notes SET category = ?, content = ? WHERE id = ?', (category, content, note_id))
-        elif content:
-            cursor.execute('UPDATE notes SET content = ? WHERE id = ?', (content, note_id))
-        elif category:
-            cursor.execute('UPDATE notes SET category = ? WHERE id = ?', (category, note_id))
-        memory_store.conn.commit()
-        updated = cursor.rowcount > 0
-    
-    if updated:
+    if memory_store.update_note(note_id, category, content):
         return jsonify({'status': 'ok'})
     return jsonify({'status': 'error', 'error': 'Note not found'}), 404
 
@@ -26,9 +26,9 @@ class LogManager {
             if (data.logs && data.logs.length > 0) {
                 this.processLogs(data.logs);
 
-                // Update timestamp to the latest one
+                // Resume after the latest one (seq never goes backwards)
                 const latest = data.logs[data.logs.length - 1];
-                this.lastTimestamp = latest.created;
+                this.lastTimestamp = latest.seq;
             }
         } catch (e) {
             console.error("Failed to poll logs", e);